@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+from djangodoo.models import OdooModel
+
+
+class Country(OdooModel):
+    _odoo_model = "res.country"
+
+
+class Partner(OdooModel):
+    _odoo_model = "res.partner"
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+from django.utils.six.moves import socketserver
+from django.utils.six.moves.xmlrpc_server import (MultiPathXMLRPCServer, SimpleXMLRPCDispatcher,
+                                                  SimpleXMLRPCRequestHandler)
+import gzip
+import io
+import json
+import threading
+import time
+
+"""
+    Stand-in Odoo server for the benchmarks
+
+    `FakeOdoo` serves the XML-RPC services (/xmlrpc/db, /xmlrpc/common and /xmlrpc/object) and
+    the /jsonrpc endpoint of Odoo, for synthetic countries, partners and users, in a background
+    thread. Each call sleeps *latency* seconds to simulate the network and Odoo; the calls are
+    counted in *calls*.
+"""
+
+FIELDS = {
+    'ir.model': {
+        'model': {'type': 'char', 'string': 'Model'},
+        'name': {'type': 'char', 'string': 'Name'},
+    },
+    'res.country': {
+        'name': {'type': 'char', 'string': 'Country Name', 'required': True, 'size': 64, 'translate': True},
+        'code': {'type': 'char', 'string': 'Country Code', 'size': 2},
+    },
+    'res.partner': {
+        'name': {'type': 'char', 'string': 'Name', 'required': True},
+        'email': {'type': 'char', 'string': 'Email'},
+        'active': {'type': 'boolean', 'string': 'Active'},
+        'type': {'type': 'selection', 'string': 'Address Type',
+                 'selection': [['contact', 'Contact'], ['invoice', 'Invoice address'],
+                               ['delivery', 'Shipping address']]},
+        'country_id': {'type': 'many2one', 'string': 'Country', 'relation': 'res.country'},
+        'parent_id': {'type': 'many2one', 'string': 'Related Company', 'relation': 'res.partner'},
+    },
+}
+
+
+class FakeOdoo(object):
+
+    def __init__(self, partners=1000, countries=50, users=20, latency=0.0, port=0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.data = {'ir.model': {}, 'res.country': {}, 'res.partner': {}}
+        for (i, model) in enumerate(sorted(FIELDS)):
+            self.data['ir.model'][i + 1] = {'model': model, 'name': model}
+        for i in range(1, countries + 1):
+            self.data['res.country'][i] = {'name': 'Country %d' % i, 'code': 'C%d' % (i % 100)}
+        for i in range(1, partners + 1):
+            self.data['res.partner'][i] = {
+                'name': 'Partner %d' % i, 'email': 'partner%d@example.com' % i, 'active': True,
+                'type': ('contact', 'invoice', 'delivery')[i % 3], 'country_id': 1 + i % countries,
+                'parent_id': 1 + (i - 1) // 10 * 10 if i % 10 != 1 else False,
+            }
+        self.users = dict(('user%d' % i, 'password%d' % i) for i in range(users))
+        self.users['admin'] = 'admin'
+        self._server = self._make_server(port)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # RPC services
+
+    def login(self, db, user, password):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        return sorted(self.users).index(user) + 1 if self.users.get(user) == password else False
+
+    def execute(self, db, uid, password, model, method, *args):
+        return self.execute_kw(db, uid, password, model, method, list(args))
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        kwargs = kwargs or {}
+        if method in ('fields_get', 'fields_get_keys'):
+            return dict(FIELDS[model]) if method == 'fields_get' else sorted(FIELDS[model])
+        if method == 'read':
+            return self._read(model, args[0], args[1] if len(args) > 1 else kwargs.get('fields'))
+        if method == 'search':
+            (offset, limit, order) = (list(args[1:4]) + [0, None, None])[:3]
+            return self._search(model, args[0], kwargs.get('offset', offset), kwargs.get('limit', limit),
+                                kwargs.get('order', order))
+        if method == 'search_count':
+            return len(self._search(model, args[0]))
+        if method == 'search_read':
+            ids = self._search(model, args[0], kwargs.get('offset'), kwargs.get('limit'), kwargs.get('order'))
+            return self._read(model, ids, kwargs.get('fields'))
+        if method == 'write':
+            for odoo_id in args[0]:
+                self.data[model][odoo_id].update(args[1])
+            return True
+        if method == 'create':
+            values = args[0]
+            res = []
+            for vals in (values if isinstance(values, list) else [values]):
+                with self._lock:
+                    odoo_id = max(self.data[model] or [0]) + 1
+                    self.data[model][odoo_id] = dict(vals)
+                res.append(odoo_id)
+            return res if isinstance(values, list) else res[0]
+        raise ValueError("Unsupported method %s" % method)
+
+    def _read(self, model, ids, fields=None):
+        res = []
+        for odoo_id in ids:
+            record = self.data[model].get(odoo_id)
+            if record is None:
+                continue
+            values = {'id': odoo_id}
+            for name in (fields or FIELDS[model]):
+                value = record.get(name, False)
+                if value and FIELDS[model][name]['type'] == 'many2one':
+                    relation = FIELDS[model][name]['relation']
+                    value = [value, self.data[relation][value].get('name')]
+                values[name] = value
+            res.append(values)
+        return res
+
+    def _search(self, model, domain, offset=0, limit=None, order=None):
+        ids = sorted(odoo_id for (odoo_id, record) in self.data[model].items()
+                     if all(self._match(odoo_id, record, leaf) for leaf in domain if isinstance(leaf, list)))
+        if order and order.endswith('desc'):
+            ids.reverse()
+        ids = ids[offset or 0:]
+        return ids[:limit] if limit else ids
+
+    def _match(self, odoo_id, record, leaf):
+        (name, operator, value) = leaf
+        actual = odoo_id if name == 'id' else record.get(name)
+        if operator == '=':
+            return actual == value
+        if operator == '>':
+            return actual > value
+        if operator == 'in':
+            return actual in value
+        if operator == 'like':
+            return value in (actual or '')
+        raise ValueError("Unsupported operator %s" % operator)
+
+    # transport
+
+    def _jsonrpc(self, body):
+        request = json.loads(body.decode('utf-8'))
+        params = request['params']
+        try:
+            if params['service'] == 'common':
+                result = {'result': self.login(*params['args'])}
+            else:
+                result = {'result': self.execute_kw(*params['args'])}
+        except Exception as e:
+            result = {'error': {'message': 'Odoo Server Error', 'data': {'message': str(e)}}}
+        result.update(jsonrpc='2.0', id=request['id'])
+        return json.dumps(result).encode('utf-8')
+
+    def _make_server(self, port):
+        fake = self
+
+        class Handler(SimpleXMLRPCRequestHandler):
+            rpc_paths = ()
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                if self.path != '/jsonrpc':
+                    return SimpleXMLRPCRequestHandler.do_POST(self)
+                body = fake._jsonrpc(self.rfile.read(int(self.headers['Content-Length'])))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+                    compressed = io.BytesIO()
+                    with gzip.GzipFile(fileobj=compressed, mode='wb') as gzip_file:
+                        gzip_file.write(body)
+                    body = compressed.getvalue()
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(socketserver.ThreadingMixIn, MultiPathXMLRPCServer):
+            daemon_threads = True
+
+        server = Server(('127.0.0.1', port), requestHandler=Handler, allow_none=True, logRequests=False)
+        services = {
+            'db': {'server_version': lambda: '12.0', 'list': lambda: ['bench']},
+            'common': {'login': self.login, 'version': lambda: {'server_version': '12.0'}},
+            'object': {'execute': self.execute, 'execute_kw': self.execute_kw},
+        }
+        for (service, functions) in services.items():
+            dispatcher = SimpleXMLRPCDispatcher(allow_none=True, encoding=None)
+            for (name, function) in functions.items():
+                dispatcher.register_function(function, name)
+            server.add_dispatcher('/xmlrpc/%s' % service, dispatcher)
+        return server
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmarks of Djangodoo against a stand-in Odoo server
+
+    Run from the root of the repository:
+
+        python -m benchmarks.run [--partners 1000] [--latency 0.001] [--output results.json]
+                                 [--compare previous.json]
+
+    The results are printed, and written as JSON with --output; --compare prints the ratios of
+    the best times of this run to those of a previous output.
+"""
+from __future__ import print_function
+import argparse
+import json
+import platform
+import sys
+import time
+
+from .fake_odoo import FakeOdoo
+
+BENCHMARKS = ["load", "load_bulk", "search", "lazy_search", "push", "push_batch", "auth_login", "user_client"]
+
+
+def configure(args, port):
+    from django.conf import settings
+    settings.configure(
+        INSTALLED_APPS=["django.contrib.auth", "django.contrib.contenttypes", "djangodoo", "benchmarks.benchapp"],
+        DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": args.database}},
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        ODOO_HOST={"USER": "admin", "PASSWORD": "admin", "HOST": "http://127.0.0.1", "PORT": port, "DB": "bench",
+                   "PROTOCOL": args.protocol},
+        ODOO_SCHEMA_CACHE=args.schema_cache,
+        LANGUAGE_CODE="en-us",
+        USE_TZ=False,
+    )
+
+
+def create_tables():
+    from django.apps import apps
+    from django.db import connection
+    with connection.schema_editor() as editor:
+        for model in apps.get_models():
+            editor.create_model(model)
+
+
+def measure(server, func, setup, repeat):
+    """Runs *func* *repeat* times (after *setup*, which is not timed), and returns its statistics
+
+        The numbers of calls and bytes are those of the last run.
+    """
+    from djangodoo.instrumentation import collect_calls
+    times = []
+    for _i in range(repeat):
+        context = setup()
+        with collect_calls() as calls:
+            server_calls = server.calls
+            started = time.time()
+            ops = func(context)
+            times.append(time.time() - started)
+            server_calls = server.calls - server_calls
+    times.sort()
+    best = times[0]
+    return {"ops": ops, "times": times, "best": best, "median": times[len(times) // 2],
+            "ops_per_sec": ops / best if best else None, "rpc_calls": server_calls,
+            "rpc_sent": sum(call["sent"] or 0 for call in calls),
+            "rpc_received": sum(call["received"] or 0 for call in calls)}
+
+
+def benchmarks(server, args):
+    from djangodoo.auth import OdooAuthBackend
+    from djangodoo.batch import odoo_batch
+    from djangodoo.client import get_user_clients
+    from djangodoo.models import OdooUser
+    from .benchapp.models import Country, Partner
+
+    partner_ids = sorted(server.data["res.partner"])
+    users = sorted((user, password) for (user, password) in server.users.items() if user != "admin")
+
+    def clear():
+        Partner.objects.all().delete()
+        Country.objects.all().delete()
+
+    def loaded():
+        clear()
+        Partner.odoo_load(partner_ids, bulk=True)
+        return list(Partner.objects.order_by("odoo_id")[:args.pushes])
+
+    def load(bulk):
+        def run(context):
+            Partner.odoo_load(partner_ids, bulk=bulk)
+            return len(partner_ids)
+        return run
+
+    def search(context):
+        count = 0
+        for offset in range(0, len(partner_ids), args.page_size):
+            count += len(Partner.odoo_search([], offset=offset, limit=args.page_size, order="id"))
+        return count
+
+    def lazy_search(context):
+        return sum(1 for _obj in Partner.odoo_lazy_search([], order="id", page_size=args.page_size))
+
+    def push(context):
+        for obj in context:
+            obj.name = "%s *" % obj.name
+            obj.odoo_push()
+        return len(context)
+
+    def push_batch(context):
+        with odoo_batch():
+            return push(context)
+
+    def login_setup():
+        get_user_clients().clear()
+        return OdooAuthBackend()
+
+    def login(backend):
+        for _i in range(args.logins):
+            for (user, password) in users:
+                backend.authenticate(username=user, password=password)
+        return args.logins * len(users)
+
+    def user_client_setup():
+        login(login_setup())
+
+    def user_client(context):
+        # each request gets new instances, whose client is taken from the cache of the clients
+        for _i in range(args.logins):
+            for (user, _password) in users:
+                OdooUser.objects.select_related("user").get(user__username=user).odoo_client
+        return args.logins * len(users)
+
+    return {
+        "load": (load(False), lambda: clear()),
+        "load_bulk": (load(True), lambda: clear()),
+        "search": (search, lambda: clear()),
+        "lazy_search": (lazy_search, lambda: clear()),
+        "push": (push, loaded),
+        "push_batch": (push_batch, loaded),
+        "auth_login": (login, login_setup),
+        "user_client": (user_client, user_client_setup),
+    }
+
+
+def compare(results, path):
+    with open(path) as previous_file:
+        previous = json.load(previous_file)["results"]
+    print("\n%-16s %12s %12s %8s" % ("benchmark", "previous [s]", "current [s]", "ratio"))
+    for (name, result) in sorted(results.items()):
+        if name in previous and previous[name]["best"]:
+            print("%-16s %12.4f %12.4f %8.2f" % (name, previous[name]["best"], result["best"],
+                                                 result["best"] / previous[name]["best"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of Djangodoo against a stand-in Odoo server")
+    parser.add_argument("--partners", type=int, default=1000, help="number of partners in Odoo")
+    parser.add_argument("--countries", type=int, default=50, help="number of countries in Odoo")
+    parser.add_argument("--users", type=int, default=20, help="number of users logging in")
+    parser.add_argument("--latency", type=float, default=0.001, help="latency of each call to Odoo, in seconds")
+    parser.add_argument("--protocol", choices=["xmlrpc", "jsonrpc"], default="xmlrpc")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each benchmark")
+    parser.add_argument("--page-size", type=int, default=80, help="page size of the searches")
+    parser.add_argument("--pushes", type=int, default=100, help="number of records pushed")
+    parser.add_argument("--logins", type=int, default=5, help="number of logins of each user")
+    parser.add_argument("--database", default=":memory:", help="SQLite database (in memory by default)")
+    parser.add_argument("--schema-cache", default=None, help="ODOO_SCHEMA_CACHE snapshot used at startup")
+    parser.add_argument("--only", default=None, help="comma-separated benchmarks to run (%s)" % ",".join(BENCHMARKS))
+    parser.add_argument("--output", default=None, help="file in which the results are written as JSON")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    server = FakeOdoo(partners=args.partners, countries=args.countries, users=args.users,
+                      latency=args.latency).start()
+    configure(args, server.port)
+
+    # startup: connection to Odoo and preparation of the models (`add_extra_model_fields`)
+    import django
+    calls = server.calls
+    started = time.time()
+    django.setup()
+    startup = time.time() - started
+    results = {"startup": {"ops": 1, "times": [startup], "best": startup, "median": startup,
+                           "ops_per_sec": 1 / startup, "rpc_calls": server.calls - calls}}
+    # djangodoo keeps the credentials in memcached, which is not measured here
+    from django.conf import settings
+    settings.CACHES["odoo_auth"] = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "auth"}
+    create_tables()
+
+    selected = args.only.split(",") if args.only else BENCHMARKS
+    for (name, (func, setup)) in sorted(benchmarks(server, args).items(), key=lambda item: BENCHMARKS.index(item[0])):
+        if name in selected:
+            results[name] = measure(server, func, setup, args.repeat)
+    server.stop()
+
+    print("%-16s %8s %10s %10s %12s %10s" % ("benchmark", "ops", "best [s]", "median [s]", "ops/s", "rpc calls"))
+    for name in ["startup"] + [name for name in BENCHMARKS if name in results]:
+        result = results[name]
+        print("%-16s %8d %10.4f %10.4f %12.1f %10d" % (name, result["ops"], result["best"], result["median"],
+                                                      result["ops_per_sec"] or 0, result["rpc_calls"]))
+    if args.output:
+        meta = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                "django": django.get_version(), "argv": sys.argv[1:],
+                "options": dict((key, value) for (key, value) in vars(args).items()
+                                if key not in ("output", "compare"))}
+        with open(args.output, "w") as output:
+            json.dump({"meta": meta, "results": results}, output, indent=2, sort_keys=True)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
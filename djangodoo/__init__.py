@@ -2,10 +2,13 @@
 from django.conf import settings
 from django.db.models.signals import class_prepared
 from django.core.mail import send_mail
-import erppeek
-from .fields import convert_field
+from .fields import convert_field, Many2OneField, OdooDeferredAttribute, OdooLazyRelatedAttribute
+from .breaker import get_breaker
+from .client import connect_default, LazyClient
+from . import schema
 import logging
 
+from threading import Thread
 from time import sleep
 import traceback
 
@@ -18,81 +21,112 @@ def set_auth_cache():
                                     'LOCATION': '127.0.0.1:18069'}
 
 
-def set_odoo_client():
-    config = getattr(settings, "ODOO_HOST", False)
+def _notify_failure(config, max_retry_attempts, retry_delay):
+    mail_config = getattr(settings, "ODOO_EMAIL_NOTIFICATION", False)
+    mail_content = """Unable to connect to a running Odoo server. Your application may have failed to start up due to a connection problem with an Odoo instance.
+    
+    Djangodoo tried to reconnect {} times, waiting {} seconds between each attempt. Still, the server could not be reached.
 
-    logger.info("Setting up the Odoo client...")
+    The problem occured with the following host configuration:
+        
+        USER: {}
+        HOST: {}
+        PORT: {}
+        DB: {}
+
+    And here is the traceback of the exception raised during the last attempt:
+
+
+    {}
+        
+    """.format(max_retry_attempts, retry_delay, config['USER'], config['HOST'], config['PORT'], config['DB'], traceback.format_exc())
+    html_content = """<p>Unable to connect to a running Odoo server. Your application may have failed to start up due to a connection problem with an Odoo instance.</p>
+    
+    <p>Djangodoo tried to reconnect <b>{} times</b>, waiting <b>{} seconds</b> between each attempt. Still, the server could not be reached.</p>
+
+    <p>The problem occured with the following host configuration:</p>
+    
+    <div style="border-left: 1px solid gray; padding-left: 10px;">
+        USER: {}<br>
+        HOST: {}<br>
+        PORT: {}<br>
+        DB: {}<br>
+    </div>
+
+    <p>And here is the traceback of the exception raised during the last attempt:</p>
+
+    <pre>
+
+    {}
+
+    </pre>
+        
+    """.format(max_retry_attempts, retry_delay, config['USER'], config['HOST'], config['PORT'], config['DB'], traceback.format_exc())
+    if mail_config:
+        logger.info('Sending an email notification to the administrator...')
+        send_mail("APPLICATION FAILURE - DJANGODOO",
+            mail_content,
+            getattr(settings, "DEFAULT_FROM_EMAIL", "djangodoo@example.com"),
+            mail_config["RECIPIENTS"],
+            html_message=html_content,
+            fail_silently=False)
+
+
+def connect_at_startup():
+    """Logs in the client of the settings, retrying ODOO_MAX_RETRY_ATTEMPTS times every ODOO_RETRY_DELAY [s]
+
+        If all the attempts fail, the error is logged, an email is sent to the recipients of
+        ODOO_EMAIL_NOTIFICATION (if set), and the exception is raised. The attempts are not
+        stopped by the circuit breaker (see `djangodoo.breaker`), which is reset before each one.
+    """
+    config = getattr(settings, "ODOO_HOST", False)
     max_retry_attempts = getattr(settings, "ODOO_MAX_RETRY_ATTEMPTS", 3)
     retry_delay = getattr(settings, "ODOO_RETRY_DELAY", 5)
-
-    def _connect(retry_cnt):
+    breaker = get_breaker()
+    for retry_cnt in range(max_retry_attempts + 1):
+        if breaker is not None:
+            breaker.reset()
         try:
-            settings.odoo = erppeek.Client("%s:%d" % (config['HOST'], config['PORT']), db=config['DB'],
-                                           user=config['USER'], password=config['PASSWORD'], verbose=False)
-            settings.odoo.context = {"lang": settings.LANGUAGE_CODE}
-            settings.odoo_models = {}
-            settings.deferred_m2o = {}
-            settings.deferred_o2m = {}
+            settings.odoo.get()
+            logger.info("Connected to Odoo.")
+            return
         except:
             logger.warn('Failed to connect to a running Odoo server.')
-            logger.warn('Waiting {} [s] before the next attempt...'.format(retry_delay))
-            logger.warn('{} trials left...'.format(max_retry_attempts-retry_cnt))
-            sleep(retry_delay)
-            if retry_cnt < max_retry_attempts:
-                _connect(retry_cnt + 1)
-            else:
+            if retry_cnt == max_retry_attempts:
                 logger.error('Unable to connect to a running Odoo server. Aborting.')
-                mail_config = getattr(settings, "ODOO_EMAIL_NOTIFICATION", False)
-                mail_content = """Unable to connect to a running Odoo server. Your application may have failed to start up due to a connection problem with an Odoo instance.
-                
-                Djangodoo tried to reconnect {} times, waiting {} seconds between each attempt. Still, the server could not be reached.
-
-                The problem occured with the following host configuration:
-                    
-                    USER: {}
-                    HOST: {}
-                    PORT: {}
-                    DB: {}
-
-                And here is the traceback of the exception raised during the last attempt:
-
-
-                {}
-                    
-                """.format(max_retry_attempts, retry_delay, config['USER'], config['HOST'], config['PORT'], config['DB'], traceback.format_exc())
-                html_content = """<p>Unable to connect to a running Odoo server. Your application may have failed to start up due to a connection problem with an Odoo instance.</p>
-                
-                <p>Djangodoo tried to reconnect <b>{} times</b>, waiting <b>{} seconds</b> between each attempt. Still, the server could not be reached.</p>
-
-                <p>The problem occured with the following host configuration:</p>
-                
-                <div style="border-left: 1px solid gray; padding-left: 10px;">
-                    USER: {}<br>
-                    HOST: {}<br>
-                    PORT: {}<br>
-                    DB: {}<br>
-                </div>
-
-                <p>And here is the traceback of the exception raised during the last attempt:</p>
-
-                <pre>
-
-                {}
-
-                </pre>
-                    
-                """.format(max_retry_attempts, retry_delay, config['USER'], config['HOST'], config['PORT'], config['DB'], traceback.format_exc())
-                if mail_config:
-                    logger.info('Sending an email notification to the administrator...')
-                    send_mail("APPLICATION FAILURE - DJANGODOO",
-                        mail_content,
-                        getattr(settings, "DEFAULT_FROM_EMAIL", "djangodoo@example.com"),
-                        mail_config["RECIPIENTS"],
-                        html_message=html_content,
-                        fail_silently=False)
+                _notify_failure(config, max_retry_attempts, retry_delay)
                 raise
+        logger.warn('Waiting {} [s] before the next attempt...'.format(retry_delay))
+        logger.warn('{} trials left...'.format(max_retry_attempts - retry_cnt))
+        sleep(retry_delay)
 
-    _connect(0)
+
+def set_odoo_client():
+    """Sets the client of Odoo of the settings, which logs in on first use
+
+        If ODOO_CONNECT_AT_STARTUP is True, the client logs in now (see `connect_at_startup`); if it
+        is "background", it logs in in a background thread, so that the startup is not delayed.
+    """
+    logger.info("Setting up the Odoo client...")
+    settings.odoo = LazyClient(connect_default)
+    settings.odoo_models = {}
+    settings.deferred_m2o = {}
+    settings.deferred_m2m = {}
+    settings.deferred_o2m = {}
+    startup = getattr(settings, "ODOO_CONNECT_AT_STARTUP", False)
+    if startup == "background":
+        thread = Thread(target=_connect_in_background, name="djangodoo-connect")
+        thread.daemon = True
+        thread.start()
+    elif startup:
+        connect_at_startup()
+
+
+def _connect_in_background():
+    try:
+        connect_at_startup()
+    except Exception:
+        pass  # already logged; the client logs in again on first use
 
 
 def add_extra_model_fields(sender, **kwargs):
@@ -105,21 +139,32 @@ def add_extra_model_fields(sender, **kwargs):
         if odoo_field:
             field = odoo_field.to_django()
             field.contribute_to_class(django_model, field_details['name'])
+            if field_details['name'] in (getattr(django_model, "_odoo_deferred_fields", None) or []) and \
+                    not field.many_to_many:
+                setattr(django_model, field.attname, OdooDeferredAttribute(field))
+            if isinstance(odoo_field, Many2OneField) and getattr(django_model, "_odoo_lazy_m2o", False):
+                setattr(django_model, field.name,
+                        OdooLazyRelatedAttribute(field, django_model.__dict__[field.name]))
+            django_model._odoo_plan = None
 
-    odoo = settings.odoo
     if getattr(sender, "_odoo_model", False):
         settings.odoo_models[sender._odoo_model] = sender
-        _all_fields = odoo.model(sender._odoo_model).fields(sender._get_odoo_fields())
+        if getattr(sender, "_odoo_write_behind", False):
+            # the instances created locally have no odoo_id until the queue creates their record
+            odoo_id = sender._meta.get_field("odoo_id")
+            odoo_id.null = odoo_id.blank = True
+        _all_fields = schema.get_fields(sender._odoo_model, sender._get_odoo_fields())
         for fname, fdetails in _all_fields.items():
-            fdetails['name'] = fname
+            fdetails = dict(fdetails, name=fname)
             fdetails['model'] = sender._odoo_model
             add_field(sender, fdetails)
 
-        if sender._odoo_model in settings.deferred_m2o:
-            for m2o_details in settings.deferred_m2o[sender._odoo_model]:
-                origin = settings.odoo_models[m2o_details['model']]
-                add_field(origin, m2o_details)
-            settings.deferred_m2o[sender._odoo_model] = []
+        for deferred in (settings.deferred_m2o, settings.deferred_m2m):
+            if sender._odoo_model in deferred:
+                for details in deferred[sender._odoo_model]:
+                    origin = settings.odoo_models[details['model']]
+                    add_field(origin, details)
+                deferred[sender._odoo_model] = []
 
 set_auth_cache()
 set_odoo_client()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.db import close_old_connections
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+import asyncio
+from .client import get_pool
+
+"""
+    Asynchronous calls to Odoo
+
+    The operations run in a dedicated executor of ODOO_ASYNC_WORKERS threads (ODOO_POOL_SIZE by
+    default), each call using a client checked out of the pool of clients, so that the connections
+    are reused and several calls can be awaited together with `asyncio.gather`.
+"""
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, "ODOO_ASYNC_WORKERS",
+                              getattr(settings, "ODOO_POOL_SIZE", getattr(settings, "ODOO_WORKERS", 4)))
+            _executor = ThreadPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def _call(func, args, kwargs):
+    close_old_connections()
+    try:
+        if kwargs.get("client"):
+            return func(*args, **kwargs)
+        with get_pool().client() as client:
+            kwargs["client"] = client
+            return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def run(func, *args, **kwargs):
+    """Calls *func* in the executor, with a client of the pool unless a *client* is given
+
+        :return asyncio.Future: the result of the call
+    """
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(get_executor(), partial(_call, func, args, kwargs))
@@ -1,6 +1,5 @@
-from django.conf import settings
 from django.contrib.auth.models import User
-import erppeek
+from .client import connect, get_user_clients
 from .models import OdooUser
 from django.core.cache import caches
 from django.db import transaction
@@ -13,12 +12,12 @@ class OdooAuthBackend(object):
     """
     @transaction.atomic
     def authenticate(self, username=None, password=None):
-        config = getattr(settings, "ODOO_HOST", False)
+        # the credentials are always checked by Odoo; the client is then shared with the OdooUser
         try:
-            odoo_client = erppeek.Client("%s:%d" % (config['HOST'], config['PORT']), db=config['DB'],
-                                         user=username, password=password, verbose=False)
+            odoo_client = connect(username, password)
         except:
             return None
+        get_user_clients().set(username, password, odoo_client)
 
         caches["odoo_auth"].set('%s_credentials' % username, password, None)
 
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+
+_local = threading.local()
+
+
+class OdooPushBatch(object):
+
+    """Pushes of Django instances into Odoo, collected to be sent together
+
+        The values pushed into the same record are merged, then the records of a model having
+        the same values are written with a single `write`. The new records of a model are created
+        with a single `create` if *multi_create* is True (setting ODOO_MULTI_CREATE; Odoo >= 12),
+        or one `create` per record otherwise; their identifiers are then assigned to the
+        *odoo_id* of the instances. The instances are marked clean (see
+        `OdooModel._odoo_mark_clean`) only once their values are sent.
+    """
+
+    def __init__(self, client=None, multi_create=None):
+        self.client = client
+        self.multi_create = getattr(settings, "ODOO_MULTI_CREATE", False) if multi_create is None else multi_create
+        self._writes = OrderedDict()  # (client, odoo model, odoo id): (values, pushed)
+        self._creates = OrderedDict()  # (client, odoo model): [(instance, values, pushed)]
+        # pushed: {id of the instance: (instance, field names, snapshot)}, see `_mark_clean`
+
+    def add(self, obj, values, client=None, fieldnames=None):
+        """Collects the push of *values* into the record of *obj*, which pushes the fields *fieldnames*"""
+        client = client or self.client or settings.odoo
+        if obj.odoo_id:
+            (merged, pushed) = self._writes.setdefault((client, obj._odoo_model, obj.odoo_id), ({}, OrderedDict()))
+            for (name, value) in values.items():
+                # the commands of a many2many field are appended to the previous ones
+                if isinstance(value, list) and isinstance(merged.get(name), list):
+                    value = merged[name] + value
+                merged[name] = value
+        else:
+            pushed = OrderedDict()
+            self._creates.setdefault((client, obj._odoo_model), []).append((obj, values, pushed))
+        (values, m2m) = obj._odoo_snapshot(fieldnames)
+        if id(obj) in pushed:
+            # pushed again: the previous state is completed by the new one
+            (_obj, previous_fieldnames, (previous_values, previous_m2m)) = pushed[id(obj)]
+            if fieldnames is not None and previous_fieldnames is not None:
+                fieldnames = sorted(set(previous_fieldnames) | set(fieldnames))
+            else:
+                fieldnames = None
+            previous_values.update(values)
+            previous_m2m.update(m2m)
+            (values, m2m) = (previous_values, previous_m2m)
+        pushed[id(obj)] = (obj, fieldnames, (values, m2m))
+
+    def _mark_clean(self, pushed):
+        for (obj, fieldnames, snapshot) in pushed:
+            obj._odoo_mark_clean(fieldnames, snapshot)
+
+    def __len__(self):
+        return len(self._writes) + sum(len(items) for items in self._creates.values())
+
+    def flush(self):
+        """Sends the pushes collected so far"""
+        groups = OrderedDict()
+        for ((client, odoo_model, odoo_id), (values, pushed)) in self._writes.items():
+            key = (client, odoo_model, repr(sorted(values.items())))
+            group = groups.setdefault(key, (values, [], []))
+            group[1].append(odoo_id)
+            group[2].extend(pushed.values())
+        for ((client, odoo_model, _key), (values, odoo_ids, pushed)) in groups.items():
+            client.model(odoo_model).write(odoo_ids, values)
+            self._mark_clean(pushed)
+        self._writes.clear()
+
+        for ((client, odoo_model), items) in self._creates.items():
+            if self.multi_create:
+                odoo_ids = client.execute(odoo_model, 'create', [values for (_obj, values, _pushed) in items])
+            else:
+                odoo_ids = [client.execute(odoo_model, 'create', values) for (_obj, values, _pushed) in items]
+            for ((obj, _values, pushed), odoo_id) in zip(items, odoo_ids):
+                obj.odoo_id = odoo_id
+                self._mark_clean(pushed.values())
+        self._creates.clear()
+
+
+def current_batch():
+    """Returns the innermost batch opened by `odoo_batch` in the current thread, or None"""
+    batches = getattr(_local, "batches", None)
+    return batches[-1] if batches else None
+
+
+@contextmanager
+def odoo_batch(client=None, multi_create=None):
+    """Collects the calls to `OdooModel.odoo_push` made in the block, and sends them together at its end
+
+        with odoo_batch():
+            for line in lines:
+                line.odoo_push()
+
+        The pushes are not sent if the block raises an exception (see `OdooPushBatch`).
+    """
+    batch = OdooPushBatch(client=client, multi_create=multi_create)
+    if not hasattr(_local, "batches"):
+        _local.batches = []
+    _local.batches.append(batch)
+    try:
+        yield batch
+    finally:
+        _local.batches.pop()
+    batch.flush()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.utils.six.moves import http_client, xmlrpc_client
+from threading import Lock
+from time import time
+import logging
+import socket
+
+logger = logging.getLogger(__name__)
+
+"""
+    Circuit breaker of the calls to Odoo
+
+    When ODOO_CIRCUIT_BREAKER_THRESHOLD (3) consecutive logins or calls fail because Odoo cannot
+    be reached (network errors and timeouts, HTTP errors of XML-RPC, HTTP 5xx errors of JSON-RPC;
+    the errors raised by Odoo itself do not count), the circuit opens: for ODOO_CIRCUIT_BREAKER_COOLDOWN
+    (30) seconds, the logins and calls raise `OdooUnavailable` at once, instead of waiting for a
+    timeout. Then a single call is let through: the circuit closes if it succeeds, and opens again otherwise.
+"""
+
+UNAVAILABLE_ERRORS = (socket.error, IOError, http_client.HTTPException, xmlrpc_client.ProtocolError)
+
+
+class OdooUnavailable(Exception):
+    """Raised instead of calling Odoo while the circuit is open"""
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, threshold=3, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = Lock()
+
+    def remaining(self):
+        """Returns the number of seconds before the next call is let through (0 if the circuit is closed)"""
+        if self.opened_at is None:
+            return 0
+        return max(self.opened_at + self.cooldown - time(), 0)
+
+    def call(self, func, *args, **kwargs):
+        """Calls *func*, unless the circuit is open"""
+        with self._lock:
+            if self.opened_at is not None:
+                if time() - self.opened_at < self.cooldown:
+                    raise OdooUnavailable("Odoo is unavailable; next attempt in %.0f [s]" % self.remaining())
+                # let this call through, while the others keep failing fast until it ends
+                self.opened_at = time()
+        try:
+            res = func(*args, **kwargs)
+        except UNAVAILABLE_ERRORS:
+            self._failure()
+            raise
+        except Exception:
+            # Odoo answered (e.g. with a fault): it is reachable
+            self._success()
+            raise
+        self._success()
+        return res
+
+    def _failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning("Odoo is unreachable: failing fast for %s [s]", self.cooldown)
+                self.opened_at = time()
+
+    def _success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Odoo is reachable again")
+            self.failures = 0
+            self.opened_at = None
+
+    def reset(self):
+        """Closes the circuit, e.g. before an explicit attempt to reach Odoo"""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+
+def _guarded(breaker, call):
+    def wrapper(*args, **kwargs):
+        return breaker.call(call, *args, **kwargs)
+    return wrapper
+
+
+def guard(client, breaker):
+    """Makes the calls of *client* with `execute` and `execute_kw` go through *breaker*, and returns it"""
+    for method_name in ("execute", "execute_kw"):
+        call = getattr(client, method_name, None)
+        if call is not None:
+            setattr(client, method_name, _guarded(breaker, call))
+    return client
+
+
+_breaker = None
+_breaker_lock = Lock()
+
+
+def get_breaker():
+    """Returns the circuit breaker of the process, or None if ODOO_CIRCUIT_BREAKER_THRESHOLD is 0"""
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            threshold = getattr(settings, "ODOO_CIRCUIT_BREAKER_THRESHOLD", 3)
+            if not threshold:
+                return None
+            _breaker = CircuitBreaker(threshold, getattr(settings, "ODOO_CIRCUIT_BREAKER_COOLDOWN", 30))
+    return _breaker
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.utils.six.moves import queue, xmlrpc_client
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from threading import Lock
+from time import time
+import erppeek
+
+from .breaker import get_breaker, guard
+from .instrumentation import instrument, instrumented_login, record_payload
+from .jsonrpc import JsonRpcClient
+
+
+class _TransportMixin(object):
+
+    """XML-RPC transport applying the TIMEOUT of ODOO_HOST and reporting the sizes of the exchanges"""
+
+    timeout = None
+
+    def make_connection(self, host):
+        connection = self._transport_class.make_connection(self, host)
+        if self.timeout is not None:
+            connection.timeout = self.timeout
+        return connection
+
+    def send_content(self, connection, request_body):
+        record_payload(len(request_body), 0)
+        return self._transport_class.send_content(self, connection, request_body)
+
+    def parse_response(self, response):
+        record_payload(0, int(response.getheader("Content-Length") or 0))
+        return self._transport_class.parse_response(self, response)
+
+
+class _Transport(_TransportMixin, xmlrpc_client.Transport):
+    _transport_class = xmlrpc_client.Transport
+
+
+class _SafeTransport(_TransportMixin, xmlrpc_client.SafeTransport):
+    _transport_class = xmlrpc_client.SafeTransport
+
+
+def search_domain(domain):
+    """Returns a copy of *domain* in which the terms written in the erppeek style (e.g.
+        'name like Agrolait') are parsed into Odoo leaves, as `erppeek.Client.search` does
+    """
+    return erppeek.searchargs((list(domain or []),))[0]
+
+
+def _login(config, user, password):
+    if config.get('PROTOCOL', 'xmlrpc') == 'jsonrpc':
+        return JsonRpcClient("%s:%d" % (config['HOST'], config['PORT']), config['DB'], user, password,
+                             timeout=config.get('TIMEOUT'))
+    transport = (_SafeTransport if config['HOST'].startswith('https') else _Transport)()
+    transport.timeout = config.get('TIMEOUT')
+    return erppeek.Client("%s:%d" % (config['HOST'], config['PORT']), db=config['DB'],
+                          user=user, password=password, transport=transport, verbose=False)
+
+
+def connect(user=None, password=None):
+    """Returns a new client logged in the Odoo server configured in ODOO_HOST
+
+        The client is logged in with the given credentials, or those of ODOO_HOST if *user* is None.
+        It uses XML-RPC (erppeek), or JSON-RPC if the PROTOCOL of ODOO_HOST is 'jsonrpc'. The login
+        and the calls of the client go through the circuit breaker (see `djangodoo.breaker`), and
+        are instrumented (see `djangodoo.instrumentation`) unless ODOO_INSTRUMENTATION is False.
+    """
+    config = getattr(settings, "ODOO_HOST", False)
+    if user is None:
+        user, password = config['USER'], config['PASSWORD']
+    instrumented = getattr(settings, "ODOO_INSTRUMENTATION", True)
+    login = partial(instrumented_login, _login) if instrumented else _login
+    breaker = get_breaker()
+    if breaker is None:
+        client = login(config, user, password)
+    else:
+        client = guard(breaker.call(login, config, user, password), breaker)
+    return instrument(client) if instrumented else client
+
+
+def connect_default():
+    """Returns a new client logged in with the credentials of ODOO_HOST, using the default language"""
+    client = connect()
+    client.context = {"lang": settings.LANGUAGE_CODE}
+    return client
+
+
+class LazyClient(object):
+
+    """Client of Odoo logged in on first use
+
+        The attributes of the client created by *factory* are accessed through the `LazyClient`,
+        which calls *factory* the first time one of them is needed (or when `get` is called).
+        If the login fails, the next use tries again (see `djangodoo.breaker` for the calls made
+        while Odoo is unreachable).
+    """
+
+    def __init__(self, factory=connect_default):
+        self.__dict__['_factory'] = factory
+        self.__dict__['_client'] = None
+        self.__dict__['_lock'] = Lock()
+
+    @property
+    def connected(self):
+        return self._client is not None
+
+    def get(self):
+        """Returns the client, logging in if needed"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self.__dict__['_client'] = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get(), name, value)
+
+
+class ClientPool(object):
+
+    """Pool of clients logged in Odoo
+
+        A client is checked out by a single thread at a time, with `with pool.client() as client:`.
+        At most *size* clients are created, on demand, by calling *factory*; when they are all
+        checked out, the next thread waits for one to be released.
+    """
+
+    def __init__(self, size, factory=connect_default):
+        self.size = size
+        self._factory = factory
+        self._clients = queue.Queue()
+        self._created = 0
+        self._lock = Lock()
+
+    def _checkout(self):
+        try:
+            return self._clients.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if not create:
+            return self._clients.get()
+        try:
+            return self._factory()
+        except:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def client(self):
+        client = self._checkout()
+        try:
+            yield client
+        finally:
+            self._clients.put(client)
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_pool():
+    """Returns the pool of clients of the application, of size ODOO_POOL_SIZE (ODOO_WORKERS by default)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClientPool(getattr(settings, "ODOO_POOL_SIZE", getattr(settings, "ODOO_WORKERS", 4)))
+    return _pool
+
+
+class UserClientCache(object):
+
+    """Clients logged in Odoo with the credentials of the users of the application
+
+        The clients are indexed by user name. At most *size* clients are kept: when the cache is
+        full, the least recently used one is dropped. A client older than *ttl* seconds, or
+        created with another password, is replaced by a new one.
+    """
+
+    def __init__(self, size, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self._clients = OrderedDict()  # user name: (client, password, creation time)
+        self._lock = Lock()
+
+    def get(self, user, password):
+        """Returns a client logged in as *user*, logging in only if there is no valid one in the cache"""
+        with self._lock:
+            entry = self._clients.pop(user, None)
+            if entry and entry[1] == password and (self.ttl is None or time() - entry[2] < self.ttl):
+                self._clients[user] = entry
+                return entry[0]
+        client = connect(user, password)
+        self.set(user, password, client)
+        return client
+
+    def set(self, user, password, client):
+        with self._lock:
+            self._clients.pop(user, None)
+            self._clients[user] = (client, password, time())
+            while len(self._clients) > self.size:
+                self._clients.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+
+_user_clients = None
+
+
+def get_user_clients():
+    """Returns the cache of the clients of the users (settings ODOO_USER_CLIENTS_SIZE and ODOO_USER_CLIENTS_TTL)"""
+    global _user_clients
+    with _pool_lock:
+        if _user_clients is None:
+            _user_clients = UserClientCache(getattr(settings, "ODOO_USER_CLIENTS_SIZE", 100),
+                                            getattr(settings, "ODOO_USER_CLIENTS_TTL", 3600))
+    return _user_clients
@@ -33,11 +33,26 @@ def field_translate(field, key):
 _ = lazy(field_translate, six.text_type)
 
 
+def selection_labels(field, lang=None):
+    """Returns the labels of the values of a selection field in the language *lang*, indexed by value
+
+        *field* is an OdooField or a Django field generated from one; *lang* is the active language
+        by default. The index is built once per language and kept in the OdooField, so that it
+        can be used to get the labels of many values (e.g. in lists or serializers).
+    """
+    field = getattr(field, "odoo_field", field)
+    lang = lang or translation.get_language() or "en-us"
+    labels = field.selection_index.get(lang)
+    if labels is None:
+        labels = dict(_get_details_in_lang(field, lang).get('selection') or ())
+        if lang in field.translation_cache:
+            field.selection_index[lang] = labels
+    return labels
+
+
 def selection_translate(field):
     def trans(val):
-        lang = translation.get_language() or "en-us"
-        details = _get_details_in_lang(field, lang)
-        return dict(details['selection'])[val]
+        return selection_labels(field)[val]
 
     trans_lazy = lazy(trans, six.text_type)
 
@@ -63,7 +78,7 @@ FIELDS_CONV = {
     "selection": "CharField",
     "many2one": "ForeignKey",
     "one2many": None,
-    #     "many2many": "",
+    "many2many": "ManyToManyField",
     #     "function": "",
     #     "related": "",
 }
@@ -76,6 +91,7 @@ class OdooField(object):
         self.translatable = details.get("translate")
         self.django_field = False
         self.translation_cache = {}  # translations cache
+        self.selection_index = {}  # selection labels by language, see `selection_labels`
         return super(OdooField, self).__init__()
 
     def to_django(self, **kwargs):
@@ -96,6 +112,16 @@ class OdooField(object):
     def convert_back(self, data):
         return data or False
 
+    def converters(self):
+        """Returns the pair (convert_data, convert_back) of this field
+
+            A converter is None if it is the one of OdooField, that only replaces False by None
+            and vice versa, so that the caller can apply it inline.
+        """
+        cls = type(self)
+        return (self.convert_data if cls.convert_data != OdooField.convert_data else None,
+                self.convert_back if cls.convert_back != OdooField.convert_back else None)
+
 
 class TextField(OdooField):
 
@@ -197,6 +223,10 @@ class Many2OneField(OdooField):
 
     def to_django(self, **kwargs):
         kwargs["null"] = not(self.details.get("required"))
+        if getattr(settings.odoo_models.get(self.details['model']), "_odoo_lazy_m2o", False):
+            # the field stores the odoo_id of the target, which may not be loaded yet
+            kwargs["to_field"] = "odoo_id"
+            kwargs["db_constraint"] = False
         if self.details['relation'] == self.details['model']:
             kwargs["to"] = "self"
         else:
@@ -204,16 +234,20 @@ class Many2OneField(OdooField):
             kwargs["to"] = to_model
         return super(Many2OneField, self).to_django(**kwargs)
 
-    def convert_data(self, data):
+    def convert_data(self, data, targets=None):
         """
             Odoo data is a pair (id, label)
             We look for objects in the target model an instance having a odoo_id equal to the first
             element of the pair ; if not found, we load it from Odoo
 
             :param (tuple or False) data: the value to convert
+            :param dict targets: if given, the instances of the target model already resolved,
+                indexed by odoo_id (see `OdooModel.odoo_resolve`); no query is made
             :return (OdooModel or False): the object instance linked to this m2o field
         """
         if data and isinstance(data, (list, tuple)) and len(data) == 2:
+            if targets is not None:
+                return targets.get(data[0])
             to_model = settings.odoo_models[self.details['relation']]
             targets = to_model.objects.filter(odoo_id=data[0])
             if targets:
@@ -234,12 +268,61 @@ class Many2OneField(OdooField):
         from .models import OdooModel
         if data and isinstance(data, OdooModel) and hasattr(data, 'odoo_id'):
             return data.odoo_id
-#         elif isinstance(data, (int, long)):
-#             return data
+        elif data and isinstance(data, six.integer_types):
+            # the odoo_id stored by a lazy many2one field
+            return data
         else:
             return False
 
 
+class Many2ManyField(OdooField):
+
+    """
+        Like a many2one field, the field is only created once the model identified by
+        details['relation'] exists in Django. Its values are not converted with the other fields:
+        they are saved with set-based updates of the table of the relation (see
+        `OdooModel._odoo_save_m2m`).
+    """
+
+    def __new__(cls, details):
+        if details['relation'] in settings.odoo_models:
+            return OdooField.__new__(cls)
+        else:
+            settings.deferred_m2m[details['relation']] = settings.deferred_m2m.get(details['relation'], [])
+            settings.deferred_m2m[details['relation']].append(details)
+            return None
+
+    def to_django(self, **kwargs):
+        if self.details['relation'] == self.details['model']:
+            kwargs["to"] = "self"
+            kwargs["symmetrical"] = False
+        else:
+            kwargs["to"] = settings.odoo_models[self.details['relation']]
+        return super(Many2ManyField, self).to_django(**kwargs)
+
+    def convert_data(self, data, targets=None):
+        """
+            Odoo data is a list of identifiers
+
+            :param dict targets: if given, the instances of the target model already resolved,
+                indexed by odoo_id; otherwise, they are resolved (see `OdooModel.odoo_resolve`)
+            :return list: the instances of the target model
+        """
+        if targets is None:
+            targets = settings.odoo_models[self.details['relation']].odoo_resolve(data or [])
+        return [targets[odoo_id] for odoo_id in data or () if odoo_id in targets]
+
+    def convert_back(self, data):
+        """
+            Django data is a list of instances (or of their odoo_id)
+
+            :return list: the Odoo command replacing the targets of the field by these ones
+        """
+        from .models import OdooModel
+        odoo_ids = [obj.odoo_id if isinstance(obj, OdooModel) else obj for obj in data or ()]
+        return [(6, 0, [odoo_id for odoo_id in odoo_ids if odoo_id])]
+
+
 class One2ManyField(OdooField):
 
     """
@@ -258,6 +341,62 @@ class One2ManyField(OdooField):
             settings.deferred_o2m[details['relation']].append(details)
 
 
+class OdooDeferredAttribute(object):
+
+    """Descriptor of a deferred field of an OdooModel (see `OdooModel._odoo_deferred_fields`)
+
+        If the instance was loaded from Odoo without the value of the field, or read from the
+        database while its value is NULL, the value is fetched from Odoo on first access.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if self.field.name in instance.__dict__.get('_odoo_pending', ()):
+            instance.odoo_fetch_deferred([self.field.name])
+        elif self.field.attname not in instance.__dict__:
+            # deferred by the queryset
+            instance.refresh_from_db(fields=[self.field.attname])
+            if instance.__dict__.get(self.field.attname) is None and instance.odoo_id:
+                instance.odoo_fetch_deferred([self.field.name])
+        return instance.__dict__.get(self.field.attname)
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+        instance.__dict__.get('_odoo_pending', set()).discard(self.field.name)
+
+
+class OdooLazyRelatedAttribute(object):
+
+    """Descriptor of a many2one field of an OdooModel having `_odoo_lazy_m2o`
+
+        It wraps the descriptor of the Django field: if the target of the field is not in the
+        database, it is loaded from Odoo on first access.
+    """
+
+    def __init__(self, field, descriptor):
+        self.field = field
+        self.descriptor = descriptor
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self.descriptor
+        try:
+            return self.descriptor.__get__(instance, owner)
+        except self.field.related_model.DoesNotExist:
+            targets = self.field.related_model.odoo_load([instance.__dict__[self.field.attname]])
+            if not targets:
+                raise
+            self.descriptor.__set__(instance, targets[0])
+            return targets[0]
+
+    def __set__(self, instance, value):
+        self.descriptor.__set__(instance, value)
+
+
 def convert_field(details):
     if not(details['type'] in FIELDS_CONV):
         return None
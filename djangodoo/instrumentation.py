@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+from django.dispatch import Signal
+from django.utils import six
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from time import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+"""
+    Instrumentation of the calls to Odoo
+
+    `instrument` wraps the `execute` and `execute_kw` methods of a client, and `instrumented_login`
+    its login (all the clients created by `djangodoo.client.connect` are instrumented unless the
+    ODOO_INSTRUMENTATION setting is False), so that each call to Odoo:
+
+    * sends the `odoo_call` signal;
+    * is added to the process-wide statistics returned by `get_stats`;
+    * is added to the lists of the `collect_calls` blocks running in the current thread (see also
+      `djangodoo.middleware.OdooCallsMiddleware`).
+
+    A call is described by its model, method, number of identifiers, duration (in seconds), the
+    bytes sent and received (None if the transport does not measure them) and the name of the
+    exception it raised, if any.
+"""
+
+odoo_call = Signal(providing_args=["client", "model", "method", "ids", "duration", "sent", "received", "error"])
+
+_local = threading.local()
+
+
+def record_payload(sent, received):
+    """Adds the sizes of an exchange with Odoo to the current call (called by the transports)"""
+    payload = getattr(_local, "payload", None)
+    if payload is not None:
+        payload[0] += sent
+        payload[1] += received
+
+
+class OdooCallStats(object):
+
+    """Number of calls, identifiers, time, bytes and errors, per Odoo model and method"""
+
+    def __init__(self):
+        self._stats = OrderedDict()  # (model, method): [calls, ids, duration, sent, received, errors]
+        self._lock = Lock()
+
+    def add(self, model, method, ids, duration, sent, received, error):
+        with self._lock:
+            stats = self._stats.setdefault((model, method), [0, 0, 0.0, 0, 0, 0])
+            stats[0] += 1
+            stats[1] += ids
+            stats[2] += duration
+            stats[3] += sent or 0
+            stats[4] += received or 0
+            stats[5] += bool(error)
+
+    def get(self):
+        with self._lock:
+            items = [(key, list(stats)) for (key, stats) in self._stats.items()]
+        return sorted([{"model": model, "method": method, "calls": calls, "ids": ids, "duration": duration,
+                        "sent": sent, "received": received, "errors": errors}
+                       for ((model, method), (calls, ids, duration, sent, received, errors)) in items],
+                      key=lambda stats: -stats["duration"])
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_stats = OdooCallStats()
+
+
+def get_stats():
+    """Returns the statistics of the calls made by the process, by decreasing total duration"""
+    return _stats.get()
+
+
+def reset_stats():
+    _stats.reset()
+
+
+@contextmanager
+def collect_calls():
+    """Collects the calls to Odoo made by the current thread in the block
+
+        with collect_calls() as calls:
+            Partner.odoo_load(ids)
+        # calls is a list of dicts (model, method, ids, duration, sent, received, error)
+    """
+    calls = []
+    if not hasattr(_local, "collectors"):
+        _local.collectors = []
+    _local.collectors.append(calls)
+    try:
+        yield calls
+    finally:
+        _local.collectors.remove(calls)
+
+
+def _count_ids(params, result):
+    if params and isinstance(params[0], (list, tuple)) and params[0] and \
+            all(isinstance(odoo_id, six.integer_types) for odoo_id in params[0]):
+        return len(params[0])
+    if isinstance(result, list):
+        return len(result)
+    return 1 if isinstance(result, six.integer_types) and not isinstance(result, bool) else 0
+
+
+def _measured(call, model, method, params, client=None):
+    """Calls *call* (without arguments) and records it as a call of the *method* of *model*
+
+        The identifiers are counted from the parameters *params* of the call, or its result. The
+        signal is sent with *client*, or with the result of the call if None (e.g. a login).
+    """
+    outer_payload = getattr(_local, "payload", None)
+    _local.payload = payload = [0, 0]
+    result = error = None
+    started = time()
+    try:
+        result = call()
+        return result
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time() - started
+        _local.payload = outer_payload
+        sent, received = payload if any(payload) else (None, None)
+        ids = _count_ids(params, result)
+        _stats.add(model, method, ids, duration, sent, received, error)
+        details = {"model": model, "method": method, "ids": ids, "duration": duration,
+                   "sent": sent, "received": received, "error": error}
+        for calls in getattr(_local, "collectors", ()):
+            calls.append(details)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s.%s: %d ids in %.3f [s]", model, method, ids, duration)
+        client = result if client is None else client
+        odoo_call.send(sender=type(client) if client is not None else None, client=client, **details)
+
+
+def _instrumented(client, method_name):
+    call = getattr(client, method_name)
+
+    def wrapper(obj, method, *args, **kwargs):
+        params = args[0] if method_name == "execute_kw" and args else args
+        return _measured(lambda: call(obj, method, *args, **kwargs), obj, method, params, client)
+    return wrapper
+
+
+def instrumented_login(login, *args, **kwargs):
+    """Calls *login* with the given arguments, and records it as a call of the `login` method of
+        the `common` service; *login* returns the new client
+    """
+    return _measured(lambda: login(*args, **kwargs), "common", "login", ())
+
+
+def instrument(client):
+    """Instruments the calls made with `execute` and `execute_kw` by *client*, and returns it"""
+    if not getattr(client, "_odoo_instrumented", False):
+        client.execute = _instrumented(client, "execute")
+        if hasattr(client, "execute_kw"):
+            client.execute_kw = _instrumented(client, "execute_kw")
+        client._odoo_instrumented = True
+    return client
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from django.utils.six.moves import http_client
+from django.utils.six.moves.urllib.parse import urlparse
+from erppeek import searchargs
+from itertools import count
+import gzip
+import io
+import json
+import socket
+import threading
+
+from .instrumentation import record_payload
+
+"""
+    JSON-RPC transport
+
+    `JsonRpcClient` calls the /jsonrpc endpoint of Odoo through a persistent HTTP connection per
+    thread, accepting gzip-compressed responses. It provides the part of the API of
+    `erppeek.Client` used by Djangodoo, so it can replace it (see `djangodoo.client.connect`).
+"""
+
+
+class JsonRpcError(Exception):
+
+    def __init__(self, error):
+        self.error = error
+        data = error.get('data') or {}
+        super(JsonRpcError, self).__init__(data.get('message') or error.get('message'))
+
+
+class JsonRpcServerError(JsonRpcError, http_client.HTTPException):
+
+    """Raised for an HTTP 5xx response (e.g. from a proxy while Odoo is down), like an unavailable Odoo"""
+
+    def __init__(self, status):
+        self.status = status
+        super(JsonRpcServerError, self).__init__({'message': 'HTTP error %d' % status})
+
+
+class JsonRpcModel(object):
+
+    """Odoo model accessed through a JsonRpcClient, like `erppeek.Model`"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self._name = name
+        self._fields = None
+
+    def _kwargs(self, context=None, **kwargs):
+        kwargs['context'] = context
+        return dict((k, v) for (k, v) in kwargs.items() if v is not None)
+
+    def read(self, ids, fields=None, context=None):
+        return self.client.execute_kw(self._name, 'read', [ids], self._kwargs(context, fields=fields))
+
+    def search(self, domain, offset=0, limit=None, order=None, context=None):
+        return self.client.search(self._name, domain, offset=offset, limit=limit, order=order, context=context)
+
+    def fields(self, names=None):
+        if self._fields is None:
+            self._fields = self.client.execute_kw(self._name, 'fields_get', [], {})
+        if names is None:
+            return self._fields
+        return dict((name, self._fields[name]) for name in names if name in self._fields)
+
+    def keys(self):
+        return sorted(self.fields())
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        def wrapper(*args, **kwargs):
+            kwargs.setdefault('context', self.client.context)
+            return self.client.execute_kw(self._name, method, list(args), self._kwargs(**kwargs))
+        return wrapper
+
+
+class JsonRpcClient(object):
+
+    """Client of the /jsonrpc endpoint of an Odoo server, logged in as *user*"""
+
+    def __init__(self, server, db, user, password, timeout=None):
+        url = urlparse(server)
+        self._connection_class = (http_client.HTTPSConnection if url.scheme == 'https'
+                                  else http_client.HTTPConnection)
+        self._netloc = url.netloc
+        self._path = (url.path.rstrip('/') or '') + '/jsonrpc'
+        self._timeout = timeout
+        self._local = threading.local()
+        self._ids = count(1)
+        self._models = {}
+        self.context = None
+        self.db = db
+        self.user = user
+        self._password = password
+        self._uid = self.call('common', 'login', db, user, password)
+        if not self._uid:
+            raise JsonRpcError({'message': 'Invalid username or password'})
+
+    def _connection(self):
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = self._connection_class(self._netloc, timeout=self._timeout)
+        return self._local.connection
+
+    def _drop_connection(self):
+        if getattr(self._local, 'connection', None) is not None:
+            self._local.connection.close()
+            self._local.connection = None
+
+    def _post(self, body):
+        """Posts *body* and returns the body of the response
+
+            The request is sent again on a new connection only if the persistent connection was
+            closed by the server before it was sent, or without any response to it, so that a call
+            is never executed twice by Odoo (in particular, a timed out request is not sent again).
+        """
+        headers = {'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'}
+        for attempt in (0, 1):
+            reused = getattr(self._local, 'connection', None) is not None
+            connection = self._connection()
+            try:
+                try:
+                    connection.request('POST', self._path, body, headers)
+                except socket.timeout:
+                    raise
+                except (http_client.HTTPException, socket.error):
+                    # e.g. broken pipe or connection reset: the server closed the persistent connection
+                    if attempt or not reused:
+                        raise
+                    self._drop_connection()
+                    continue
+                try:
+                    response = connection.getresponse()
+                except http_client.BadStatusLine:
+                    # the connection was closed without any response (RemoteDisconnected on Python 3)
+                    if attempt or not reused:
+                        raise
+                    self._drop_connection()
+                    continue
+                data = response.read()
+                break
+            except Exception:
+                self._drop_connection()
+                raise
+        record_payload(len(body), len(data))
+        if response.status >= 500:
+            raise JsonRpcServerError(response.status)
+        if response.status != 200:
+            raise JsonRpcError({'message': 'HTTP error %d' % response.status})
+        if response.getheader('Content-Encoding') == 'gzip':
+            data = gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+        return data
+
+    def call(self, service, method, *args):
+        """Calls the *method* of the RPC *service* of Odoo"""
+        body = json.dumps({'jsonrpc': '2.0', 'method': 'call', 'id': next(self._ids),
+                           'params': {'service': service, 'method': method, 'args': args}})
+        res = json.loads(self._post(body.encode('utf-8')).decode('utf-8'))
+        if res.get('error'):
+            raise JsonRpcError(res['error'])
+        return res.get('result')
+
+    def execute_kw(self, obj, method, args, kwargs=None):
+        return self._execute_kw(obj, method, args, kwargs)
+
+    def _execute_kw(self, obj, method, args, kwargs=None):
+        return self.call('object', 'execute_kw', self.db, self._uid, self._password, obj, method, args,
+                         kwargs or {})
+
+    def execute(self, obj, method, *args, **kwargs):
+        context = kwargs.pop('context', None)
+        if context:
+            kwargs['context'] = context
+        return self._execute_kw(obj, method, list(args), kwargs)
+
+    def search(self, obj, domain, offset=0, limit=None, order=None, context=None):
+        kwargs = {'offset': offset, 'limit': limit, 'order': order, 'context': context}
+        domain = searchargs((list(domain),))[0]
+        return self.execute_kw(obj, 'search', [domain], dict((k, v) for (k, v) in kwargs.items() if v))
+
+    def model(self, name):
+        if name not in self._models:
+            self._models[name] = JsonRpcModel(self, name)
+        return self._models[name]
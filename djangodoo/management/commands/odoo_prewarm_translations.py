@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from djangodoo.models import prewarm_translations
+
+
+class Command(BaseCommand):
+    help = "Fetches the translations of the Odoo fields details and stores them in the shared cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("languages", nargs="*",
+                            help="codes of the languages to fetch; by default, those of the LANGUAGES setting")
+
+    def handle(self, *args, **options):
+        prewarm_translations(options["languages"] or None)
+        self.stdout.write("Cached the translations of the Odoo fields details.")
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from djangodoo import schema
+
+
+class Command(BaseCommand):
+    help = "Fetches the fields of the Odoo models from Odoo and stores them in the ODOO_SCHEMA_CACHE snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument("odoo_models", nargs="*",
+                            help="Odoo models to refresh; by default, all the models copied in Django")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "ODOO_SCHEMA_CACHE", None):
+            raise CommandError("The ODOO_SCHEMA_CACHE setting is not defined.")
+        odoo_models = options["odoo_models"] or sorted(settings.odoo_models)
+        schema.refresh(odoo_models)
+        self.stdout.write("Refreshed the fields of %d Odoo models." % len(odoo_models))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from djangodoo.sync import sync_models
+
+
+class Command(BaseCommand):
+    help = ("Loads all the records of the Odoo models, in the order of their relational fields, "
+            "resuming an interrupted sync from its checkpoints")
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*",
+                            help="labels (app_label.ModelName) of the models to sync; by default, all the OdooModels")
+        parser.add_argument("--processes", type=int, default=None,
+                            help="number of models synced at the same time (setting ODOO_SYNC_PROCESSES, 4)")
+        parser.add_argument("--chunk-size", type=int, default=None,
+                            help="number of records loaded at a time (setting ODOO_BATCH_SIZE, 500)")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="number of threads reading the records of a model (setting ODOO_WORKERS, 1)")
+        parser.add_argument("--restart", action="store_true",
+                            help="discard the checkpoints of an interrupted sync")
+
+    def handle(self, *args, **options):
+        models = []
+        for label in options["models"]:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError("Unknown model %s" % label)
+            if model not in settings.odoo_models.values():
+                raise CommandError("%s is not an OdooModel" % label)
+            models.append(model)
+
+        def report(label, loaded, duration):
+            self.stdout.write("%s: %d records synced in %.1f [s]" % (label, loaded, duration))
+
+        sync_models(models or None, processes=options["processes"], chunk_size=options["chunk_size"],
+                    workers=options["workers"], restart=options["restart"], callback=report)
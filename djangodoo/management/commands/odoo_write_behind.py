@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from djangodoo.writebehind import process_queue, queue_stats
+import time
+
+
+class Command(BaseCommand):
+    help = "Pushes into Odoo the saves queued by the OdooModels having _odoo_write_behind"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="process the entries that are due once, instead of polling the queue")
+        parser.add_argument("--interval", type=float, default=1,
+                            help="number of seconds between two polls of the queue when it is empty")
+        parser.add_argument("--limit", type=int, default=None,
+                            help="number of entries processed at a time (setting ODOO_BATCH_SIZE, 500)")
+        parser.add_argument("--stats", action="store_true",
+                            help="only print the depth and lag of the queue")
+
+    def report(self):
+        stats = queue_stats()
+        self.stdout.write("queue: %(depth)d entries for %(records)d records, %(failed)d given up, "
+                          "lag %(lag).1f [s]" % stats)
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            return self.report()
+        while True:
+            pushed, failed = process_queue(limit=options["limit"])
+            if pushed or failed:
+                self.stdout.write("pushed %d records, %d failed" % (pushed, failed))
+                self.report()
+            if options["once"]:
+                break
+            if not pushed:
+                time.sleep(options["interval"])
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from collections import Counter
+import logging
+
+from .instrumentation import collect_calls
+
+try:
+    from django.utils.deprecation import MiddlewareMixin
+except ImportError:  # Django < 1.10
+    MiddlewareMixin = object
+
+logger = logging.getLogger(__name__)
+
+
+class OdooCallsMiddleware(MiddlewareMixin):
+
+    """Logs a summary of the calls to Odoo made while handling each request
+
+        The summary (number of calls, identifiers, time and bytes, and the calls per model and
+        method) is logged at the INFO level, or at the WARNING level if a method of a model was
+        called at least ODOO_REPEATED_CALLS_WARNING times (10 by default), which usually reveals
+        a call made in a loop. Requests without calls to Odoo are not logged. Only the calls made
+        by the thread handling the request are counted.
+    """
+
+    def process_request(self, request):
+        request._odoo_calls_collector = collect_calls()
+        request.odoo_calls = request._odoo_calls_collector.__enter__()
+
+    def process_response(self, request, response):
+        collector = getattr(request, "_odoo_calls_collector", None)
+        if collector is None:
+            return response
+        collector.__exit__(None, None, None)
+        del request._odoo_calls_collector
+        calls = request.odoo_calls
+        if calls:
+            per_method = Counter("%s.%s" % (call["model"], call["method"]) for call in calls)
+            threshold = getattr(settings, "ODOO_REPEATED_CALLS_WARNING", 10)
+            level = logging.WARNING if max(per_method.values()) >= threshold else logging.INFO
+            logger.log(level, "%s %s: %d Odoo calls, %d ids in %.3f [s], %d bytes sent, %d received (%s)",
+                       request.method, request.path, len(calls), sum(call["ids"] for call in calls),
+                       sum(call["duration"] for call in calls), sum(call["sent"] or 0 for call in calls),
+                       sum(call["received"] or 0 for call in calls),
+                       ", ".join("%s x%d" % item for item in per_method.most_common()))
+        return response
@@ -2,10 +2,27 @@
 from django.conf import settings
 from django.db import models
 from django.core.cache import caches
-import erppeek
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save
+import base64
+import logging
+from .fields import Many2OneField
+from . import schema
+from .batch import current_batch
+from .client import get_pool, get_user_clients, search_domain
+from .writebehind import enqueue, is_suppressed, suppress_write_behind
+from collections import namedtuple
+from time import time
+
+logger = logging.getLogger(__name__)
+
+# details of the fields that are translated by `OdooModel.cache_translation`
+TRANSLATED_DETAILS = ('string', 'help', 'selection')
 
 # TODO: traduction des DATA!!!
-# TODO: lazy loading des objets many2one
+
+# types of the rows returned by `OdooModel.odoo_rows`, indexed by (model, field names)
+_row_types = {}
 
 
 class OdooModel(models.Model):
@@ -16,26 +33,95 @@ class OdooModel(models.Model):
             _odoo_model: name of the Odoo model that will be copied in Django
             _odoo_fields: list of field names that will be copied from Odoo. If None, all field are copied.
             _odoo_ignore_fields: list of field names that will NOT be copied from Odoo
+            _odoo_cache_records: if True, `odoo_load` skips the records that did not change in Odoo
+                since they were last loaded (see `_odoo_load_cached`)
+            _odoo_deferred_fields: list of field names (e.g. binary fields) that are not read by
+                `odoo_load` and `odoo_search`, but fetched on first access (see `odoo_fetch_deferred`),
+                also on the instances read from the database while their value is NULL
+            _odoo_lazy_m2o: if True, the many2one fields store the Odoo identifier of their target,
+                which is only loaded on first access (see `prefetch_odoo_related`)
+            _odoo_write_behind: if True, saving an instance queues the push of its modified fields,
+                which are then pushed by a background worker (see `djangodoo.writebehind`); the odoo_id
+                of such a model is nullable, so that the instances created locally have none until then
     """
 
     _odoo_model = None
     _odoo_fields = None
     _odoo_ignore_fields = None
+    _odoo_cache_records = False
+    _odoo_deferred_fields = None
+    _odoo_lazy_m2o = False
+    _odoo_write_behind = False
 
     odoo_id = models.IntegerField(unique=True)
 
     def __init__(self, *args, **kwargs):
         self.translation_cache = {}
+        self._odoo_loaded = None  # values of the Odoo fields when loaded, see `odoo_dirty_fields`
+        self._odoo_pending = set()  # deferred fields not fetched yet, see `odoo_fetch_deferred`
+        self._odoo_m2m_changes = {}  # Odoo commands of the many2many fields to push, see `odoo_push`
         return super(OdooModel, self).__init__(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        obj = super(OdooModel, cls).from_db(db, field_names, values)
+        if cls._odoo_deferred_fields and obj.__dict__.get("odoo_id"):
+            # the deferred fields are saved as NULL until they are fetched from Odoo
+            obj._odoo_pending = set(name for name in cls._odoo_deferred_fields
+                                    if name in obj.__dict__ and obj.__dict__[name] is None)
+        return obj
+
     class Meta:
         abstract = True
 
     @classmethod
     def _get_odoo_fields(cls):
-        res = cls._odoo_fields or settings.odoo.model(cls._odoo_model).fields()
+        res = cls._odoo_fields or schema.get_fields(cls._odoo_model)
         return [f for f in res if not(f in (cls._odoo_ignore_fields or []))]
 
+    @classmethod
+    def _get_odoo_read_fields(cls):
+        """Returns the names of the fields read when loading records, i.e. without the deferred ones"""
+        return [f for f in cls._get_odoo_fields() if not(f in (cls._odoo_deferred_fields or []))]
+
+    @classmethod
+    def _get_odoo_plan(cls):
+        """Returns the conversion plan of the model, built on first use
+
+            The plan is a list of tuples (field name, attribute name, convert_data, convert_back,
+            relation), one for each field generated from an Odoo field. The converters are those
+            returned by `OdooField.converters`, and *relation* is the target Odoo model of a
+            many2one field, None otherwise. It is reset when fields are added to the model.
+        """
+        plan = cls.__dict__.get("_odoo_plan")
+        if plan is None:
+            plan = []
+            for field in cls._meta.fields:
+                if hasattr(field, "odoo_field"):
+                    convert_data, convert_back = field.odoo_field.converters()
+                    relation = (field.odoo_field.details['relation']
+                                if isinstance(field.odoo_field, Many2OneField) else None)
+                    plan.append((field.name, field.attname, convert_data, convert_back, relation))
+            cls._odoo_plan = plan
+        return plan
+
+    @classmethod
+    def _get_odoo_m2m(cls):
+        """Returns the many2many fields generated from Odoo fields (they are not in the plan)"""
+        return [field for field in cls._meta.many_to_many if hasattr(field, "odoo_field")]
+
+    @classmethod
+    def _odoo_convert_back(cls, values):
+        """Converts the Django values of *values*, indexed by field name, into Odoo values"""
+        res = {}
+        for (name, _attname, _convert_data, convert_back, _relation) in cls._get_odoo_plan():
+            if name in values:
+                res[name] = convert_back(values[name]) if convert_back else values[name] or False
+        for field in cls._get_odoo_m2m():
+            if field.name in values:
+                res[field.name] = field.odoo_field.convert_back(values[field.name])
+        return res
+
     @classmethod
     def odoo_get_all_ids(cls, client=None):
         odoo_model = cls._odoo_model
@@ -44,7 +130,7 @@ class OdooModel(models.Model):
         return ans
 
     @classmethod
-    def odoo_load(cls, odoo_ids, client=None):
+    def odoo_load(cls, odoo_ids, client=None, bulk=False, batch_size=None, workers=None, cached=None):
         """Loads records from Odoo
 
             Loads records from Odoo into Django instances given a list of Odoo identifiers *odoo_ids*.
@@ -52,7 +138,60 @@ class OdooModel(models.Model):
             to the type of field thanks to the methods defined in 'fields.py'. Each django field
             generated from a Odoo field contains a "odoo_field" attribute containing a "OdooField"
             instance.
+
+            The many2one values of all the records are resolved at once (see `_odoo_resolve_m2o`).
+            If *bulk* is True, the converted records are saved by batches of *batch_size*
+            (see `_odoo_bulk_save`) instead of one query per record. The records may be read
+            by several *workers* (see `_odoo_read`).
+
+            If *cached* is True (by default, if `_odoo_cache_records` is True), only the records
+            modified since they were last loaded are read and saved (see `_odoo_load_cached`).
+        """
+        if cls._odoo_cache_records if cached is None else cached:
+            return cls._odoo_load_cached(odoo_ids, client=client, batch_size=batch_size, workers=workers)
+        odoo_fields = cls._get_odoo_read_fields()
+        records = cls._odoo_read(odoo_ids, odoo_fields, client=client, workers=workers)
+        return cls._odoo_save_records(records, client=client, bulk=bulk, batch_size=batch_size)
+
+    @classmethod
+    def _odoo_load_cached(cls, odoo_ids, client=None, batch_size=None, workers=None):
+        """Loads the records that changed in Odoo since they were last loaded
+
+            The `write_date` of the records are read with a single call. A record is then only
+            loaded if the cache given by the ODOO_RECORD_CACHE setting ("default" by default)
+            has no entry for its model, identifier and `write_date`, or if it has no instance;
+            the entries are kept for ODOO_RECORD_CACHE_TTL seconds (3600 by default). The size of
+            the cache is bounded by the options of the cache backend. The records loaded are always
+            saved in bulk (see `_odoo_bulk_save`).
         """
+        def cache_key(odoo_id):
+            return "djangodoo:%s.%s:%d:%s" % (cls._meta.app_label, cls._meta.model_name, odoo_id,
+                                              dates[odoo_id].replace(" ", "T"))
+
+        cache = caches[getattr(settings, "ODOO_RECORD_CACHE", "default")]
+        records = (client or settings.odoo).model(cls._odoo_model).read(odoo_ids, fields=['write_date'],
+                                                                          context=None)
+        dates = dict((rec['id'], rec['write_date']) for rec in records if rec['write_date'])
+        unchanged = cache.get_many([cache_key(odoo_id) for odoo_id in dates])
+        res = dict((obj.odoo_id, obj) for obj in cls.objects.filter(
+            odoo_id__in=[odoo_id for odoo_id in dates if cache_key(odoo_id) in unchanged]))
+        for obj in res.values():
+            # as loaded by `_odoo_save_records`, so that `odoo_push` only sends their modified fields
+            obj._odoo_mark_clean()
+        stale = [rec['id'] for rec in records if rec['id'] not in res]
+        if stale:
+            # saved in bulk whatever the *bulk* of `odoo_load`: the non-bulk path does not save the
+            # existing instances, which must be up to date before being remembered as such
+            loaded = cls.odoo_load(stale, client=client, bulk=True, batch_size=batch_size, workers=workers,
+                                   cached=False)
+            res.update((obj.odoo_id, obj) for obj in loaded)
+            cache.set_many(dict((cache_key(obj.odoo_id), True) for obj in loaded if obj.odoo_id in dates),
+                           getattr(settings, "ODOO_RECORD_CACHE_TTL", 3600))
+        return [res[rec['id']] for rec in records if rec['id'] in res]
+
+    @classmethod
+    def _odoo_save_records(cls, records, client=None, bulk=False, batch_size=None):
+        """Converts records read from Odoo and saves them into Django instances (see `odoo_load`)"""
         def update_or_create(args):
             try:
                 obj = cls.objects.get(odoo_id=args["odoo_id"])
@@ -63,31 +202,407 @@ class OdooModel(models.Model):
                 obj.save()
             return obj
 
-        odoo_model = cls._odoo_model
-        odoo_fields = cls._get_odoo_fields()
         client = client or settings.odoo
-        records = client.model(odoo_model).read(odoo_ids, fields=odoo_fields, context=None)
-        res = []
-        for rec in records:
-            args = {}
-            args["odoo_id"] = rec["id"]
-            del rec["id"]
-            for field in cls._meta.fields:
-                if hasattr(field, "odoo_field") and field.name in rec:
-                    args[field.name] = field.odoo_field.convert_data(rec[field.name])
+        targets = cls._odoo_resolve_m2o(records, client=client)
+        res = [{"odoo_id": rec["id"]} for rec in records]
+        pending = []  # many2one values pointing to records of this batch
+        # the values are converted column by column, following the conversion plan
+        for (name, attname, convert_data, _convert_back, relation) in cls._get_odoo_plan():
+            if not records or name not in records[0]:
+                continue
+            if relation and cls._odoo_lazy_m2o:
+                for (rec, args) in zip(records, res):
+                    args[attname] = rec[name][0] if rec[name] else None
+            elif relation:
+                relation_targets = targets[relation]
+                for (rec, args) in zip(records, res):
+                    args[name] = convert_data(rec[name], relation_targets)
+                    if args[name] is None and rec[name]:
+                        pending.append((rec["id"], name, rec[name][0]))
+            elif convert_data:
+                for (rec, args) in zip(records, res):
+                    args[name] = convert_data(rec[name])
+            else:
+                for (rec, args) in zip(records, res):
+                    args[name] = rec[name] or None
 
-            res.append(update_or_create(args))
+        # the values come from Odoo: they must not be pushed back
+        with suppress_write_behind():
+            res = cls._odoo_bulk_save(res, batch_size) if bulk else [update_or_create(args) for args in res]
+            if pending:
+                cls._odoo_link_pending(res, pending, bulk)
+        cls._odoo_save_m2m(res, records, client=client, batch_size=batch_size)
+        deferred = [f for f in (cls._odoo_deferred_fields or []) if not records or f not in records[0]]
+        for obj in res:
+            obj._odoo_mark_clean()
+            obj._odoo_pending = set(deferred)
         return res
 
     @classmethod
-    def odoo_search(cls, domain, offset=0, limit=None, order=None, context=None, client=None):
+    def _odoo_read(cls, odoo_ids, fieldnames, client=None, workers=None):
+        """Reads the values of the fields *fieldnames* of the records *odoo_ids*
+
+            If no *client* is given and *workers* (setting ODOO_WORKERS, 1 by default) is greater
+            than 1, the identifiers are split in chunks of at most ODOO_BATCH_SIZE identifiers,
+            read concurrently by as many threads, each one with a client of the pool.
+        """
+        workers = workers or getattr(settings, "ODOO_WORKERS", 1)
+        if client or workers <= 1 or len(odoo_ids) <= 1:
+            client = client or settings.odoo
+            return client.model(cls._odoo_model).read(odoo_ids, fields=fieldnames, context=None)
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        def read(chunk):
+            with get_pool().client() as pool_client:
+                return pool_client.model(cls._odoo_model).read(chunk, fields=fieldnames, context=None)
+
+        odoo_ids = list(odoo_ids)
+        size = min(getattr(settings, "ODOO_BATCH_SIZE", 500), -(-len(odoo_ids) // workers))
+        chunks = [odoo_ids[start:start + size] for start in range(0, len(odoo_ids), size)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return [rec for records in executor.map(read, chunks) for rec in records]
+
+    @classmethod
+    def _odoo_resolve_m2o(cls, records, client=None):
+        """Resolves the many2one values of *records*, as read from Odoo
+
+            The identifiers are gathered and deduplicated per target model, so that the
+            existing instances are fetched with one query per model and the missing ones
+            are loaded from Odoo with one `read` per model. The records of the same model that
+            belong to *records* are not loaded: they are linked once the batch is saved.
+
+            :return dict: for each target Odoo model, the instances indexed by odoo_id
+        """
+        ids = {}
+        if cls._odoo_lazy_m2o:
+            return ids
+        for (name, _attname, _convert_data, _convert_back, relation) in cls._get_odoo_plan():
+            if relation:
+                relation_ids = ids.setdefault(relation, set())
+                for rec in records:
+                    if rec.get(name) and isinstance(rec[name], (list, tuple)):
+                        relation_ids.add(rec[name][0])
+        batch_ids = set(rec["id"] for rec in records)
+        res = {}
+        for relation, relation_ids in ids.items():
+            to_model = settings.odoo_models[relation]
+            res[relation] = to_model.odoo_resolve(relation_ids, client=client,
+                                                  skip_load=batch_ids if to_model is cls else ())
+        return res
+
+    @classmethod
+    def _odoo_link_pending(cls, objs, pending, bulk=False):
+        """Sets the many2one values of *objs* that point to other records of *objs*"""
+        saved = dict((obj.odoo_id, obj) for obj in objs)
+        fieldnames = {}
+        for (odoo_id, fname, target_id) in pending:
+            if target_id in saved:
+                setattr(saved[odoo_id], fname, saved[target_id])
+                fieldnames.setdefault(fname, []).append(saved[odoo_id])
+        for fname, to_update in fieldnames.items():
+            if bulk:
+                cls._odoo_bulk_update(to_update, [fname])
+            else:
+                for obj in to_update:
+                    obj.save(update_fields=[fname])
+
+    @classmethod
+    def _odoo_save_m2m(cls, objs, records, client=None, batch_size=None):
+        """Sets the many2many values of *objs*, as read in *records*
+
+            For each many2many field, the targets of all the records are resolved at once (see
+            `odoo_resolve`), then the rows of the table of the relation are compared with the
+            wanted pairs: the obsolete rows are deleted and the missing ones inserted in bulk, by
+            batches of *batch_size* (setting ODOO_BATCH_SIZE, 500 by default).
+        """
+        batch_size = batch_size or getattr(settings, "ODOO_BATCH_SIZE", 500)
+        values = dict((rec["id"], rec) for rec in records)
+        pks = [obj.pk for obj in objs]
+        for field in cls._get_odoo_m2m():
+            if not records or field.name not in records[0]:
+                continue
+            through = field.remote_field.through
+            source = through._meta.get_field(field.m2m_field_name()).attname
+            target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+            to_model = field.related_model
+            batch_ids = set(values) if to_model is cls else ()
+            targets = to_model.odoo_resolve(set(odoo_id for rec in records for odoo_id in rec[field.name] or ()),
+                                            client=client, skip_load=batch_ids)
+            if to_model is cls:
+                targets.update((obj.odoo_id, obj) for obj in objs)
+            wanted = set((obj.pk, targets[odoo_id].pk) for obj in objs
+                         for odoo_id in values[obj.odoo_id][field.name] or () if odoo_id in targets)
+            existing = {}
+            for start in range(0, len(pks), batch_size):
+                rows = through.objects.filter(**{source + "__in": pks[start:start + batch_size]})
+                existing.update(((source_pk, target_pk), pk) for (pk, source_pk, target_pk)
+                                in rows.values_list("pk", source, target))
+            obsolete = [pk for (pair, pk) in existing.items() if pair not in wanted]
+            for start in range(0, len(obsolete), batch_size):
+                through.objects.filter(pk__in=obsolete[start:start + batch_size]).delete()
+            through.objects.bulk_create([through(**{source: source_pk, target: target_pk})
+                                         for (source_pk, target_pk) in wanted if (source_pk, target_pk) not in existing],
+                                        batch_size=batch_size)
+
+    @classmethod
+    def odoo_resolve(cls, odoo_ids, client=None, skip_load=()):
+        """Returns the instances corresponding to the Odoo identifiers *odoo_ids*
+
+            The existing instances are fetched with one query per batch of ODOO_BATCH_SIZE
+            identifiers; the missing ones are loaded from Odoo with a single `read`, except
+            those whose identifier is in *skip_load*.
+
+            :return dict: the instances indexed by odoo_id
+        """
+        batch_size = getattr(settings, "ODOO_BATCH_SIZE", 500)
+        odoo_ids = sorted(set(odoo_ids))
+        res = {}
+        for start in range(0, len(odoo_ids), batch_size):
+            res.update((obj.odoo_id, obj) for obj in
+                       cls.objects.filter(odoo_id__in=odoo_ids[start:start + batch_size]))
+        missing = [odoo_id for odoo_id in odoo_ids if odoo_id not in res and odoo_id not in skip_load]
+        if missing:
+            res.update((obj.odoo_id, obj) for obj in cls.odoo_load(missing, client=client, bulk=True))
+        return res
+
+    @classmethod
+    def _odoo_bulk_save(cls, rows, batch_size=None):
+        """Saves converted records by batches
+
+            *rows* is a list of dictionaries of field values, each one containing an "odoo_id".
+            For each batch of *batch_size* rows (setting ODOO_BATCH_SIZE, 500 by default), the
+            existing instances are fetched with a single query, the new ones are inserted
+            with `bulk_create` and the others are updated with `bulk_update`. The time spent
+            on each batch is logged.
+        """
+        batch_size = batch_size or getattr(settings, "ODOO_BATCH_SIZE", 500)
+        res = []
+        for start in range(0, len(rows), batch_size):
+            started = time()
+            batch = rows[start:start + batch_size]
+            with transaction.atomic():
+                existing = dict((obj.odoo_id, obj) for obj in
+                                cls.objects.filter(odoo_id__in=[args["odoo_id"] for args in batch]))
+                to_create, to_update, fieldnames = [], [], set()
+                for args in batch:
+                    obj = existing.get(args["odoo_id"])
+                    if obj is None:
+                        to_create.append(cls(**args))
+                    else:
+                        for (k, v) in args.items():
+                            setattr(obj, k, v)
+                        fieldnames.update(args)
+                        to_update.append(obj)
+                if to_create:
+                    cls.objects.bulk_create(to_create)
+                    if any(obj.pk is None for obj in to_create):
+                        # the backend does not return the primary keys of the inserted rows
+                        to_create = cls.objects.filter(odoo_id__in=[obj.odoo_id for obj in to_create])
+                    existing.update((obj.odoo_id, obj) for obj in to_create)
+                fieldnames.discard("odoo_id")
+                if to_update and fieldnames:
+                    cls._odoo_bulk_update(to_update, sorted(fieldnames))
+            res.extend(existing[args["odoo_id"]] for args in batch)
+            logger.info("%s: saved %d records (%d created, %d updated) in %.3f [s]",
+                        cls._odoo_model, len(batch), len(batch) - len(to_update), len(to_update),
+                        time() - started)
+        return res
+
+    @classmethod
+    def _odoo_bulk_update(cls, objs, fieldnames):
+        if hasattr(cls.objects, "bulk_update"):
+            cls.objects.bulk_update(objs, fieldnames)
+        else:
+            # Django < 2.2
+            for obj in objs:
+                obj.save(update_fields=fieldnames)
+
+    @classmethod
+    def odoo_iter_sync(cls, domain=None, chunk_size=None, after_id=0, client=None, workers=None):
+        """Loads all the records matching a domain, chunk by chunk
+
+            The records are searched by increasing identifier, *chunk_size* at a time (setting
+            ODOO_BATCH_SIZE by default) and starting after the identifier *after_id*. Each chunk
+            is read (by several *workers*, see `_odoo_read`), converted and saved in bulk before the
+            next one is searched, so the memory used does not depend on the number of records.
+
+            This is a generator: after each chunk, it yields the number of records loaded so far
+            and the last identifier loaded, which can be given as *after_id* to resume the sync.
+        """
+        chunk_size = chunk_size or getattr(settings, "ODOO_BATCH_SIZE", 500)
+        loaded = 0
+        while True:
+            odoo_ids = (client or settings.odoo).search(cls._odoo_model, list(domain or []) + [('id', '>', after_id)],
+                                                        limit=chunk_size, order='id')
+            if not odoo_ids:
+                return
+            cls.odoo_load(odoo_ids, client=client, bulk=True, batch_size=chunk_size, workers=workers)
+            loaded += len(odoo_ids)
+            after_id = max(odoo_ids)
+            yield loaded, after_id
+            if len(odoo_ids) < chunk_size:
+                return
+
+    @classmethod
+    def odoo_search(cls, domain, offset=0, limit=None, order=None, context=None, client=None, bulk=False):
         """Search and load records from Odoo
 
-            We load data from Odoo based on a domain filter
+            We load data from Odoo based on a domain filter, which may contain terms written in the
+            erppeek style (see `djangodoo.client.search_domain`); the records are searched and read
+            with a single `search_read` call.
+        """
+        client = client or settings.odoo
+        kwargs = {"fields": cls._get_odoo_read_fields(), "offset": offset, "limit": limit, "order": order,
+                  "context": context}
+        records = client.execute_kw(cls._odoo_model, 'search_read', [search_domain(domain)],
+                                    dict((k, v) for (k, v) in kwargs.items() if v))
+        return cls._odoo_save_records(records, client=client, bulk=bulk) if records else []
+
+    @classmethod
+    def odoo_lazy_search(cls, domain, order=None, page_size=None, context=None, client=None):
+        """Search records in Odoo, loading them page by page on demand
+
+            :return OdooSearchResult: the lazy result of the search
+        """
+        return OdooSearchResult(cls, domain, order=order, page_size=page_size, context=context, client=client)
+
+    @classmethod
+    def _odoo_row_converters(cls, fieldnames):
+        """Returns the function converting the value read from Odoo of each field of *fieldnames*
+
+            The values are converted like `odoo_load` does, except that the many2one values are
+            the Odoo identifiers of their targets, and the many2many values lists of identifiers.
+        """
+        converters = {}
+        for (name, _attname, convert_data, _convert_back, relation) in cls._get_odoo_plan():
+            if relation:
+                converters[name] = lambda value: value[0] if value else None
+            else:
+                converters[name] = convert_data or (lambda value: value or None)
+        for field in cls._get_odoo_m2m():
+            converters[field.name] = lambda value: value or []
+        # the other fields of the Odoo model are left as read
+        return [converters.get(name, lambda value: value) for name in fieldnames]
+
+    @classmethod
+    def odoo_values(cls, domain=None, fieldnames=None, order=None, chunk_size=None, context=None, client=None):
+        """Reads the converted values of records from Odoo, without creating instances nor saving them
+
+            The records matching *domain* are read with `search_read`, *chunk_size* at a time (setting
+            ODOO_BATCH_SIZE, 500 by default): by increasing identifier, or by pages sorted by *order*
+            if given. The values of the fields *fieldnames* (by default, those read by `odoo_load`)
+            are converted by `_odoo_row_converters`.
+
+            This is a generator: it yields a tuple per record, containing its Odoo identifier then
+            the values of the fields in the order of *fieldnames*, so that only one chunk of records
+            is held in memory at a time.
+        """
+        client = client or settings.odoo
+        chunk_size = chunk_size or getattr(settings, "ODOO_BATCH_SIZE", 500)
+        domain = search_domain(domain)
+        fieldnames = list(fieldnames or cls._get_odoo_read_fields())
+        converters = cls._odoo_row_converters(fieldnames)
+        kwargs = {"fields": fieldnames, "limit": chunk_size, "order": order or "id"}
+        if context:
+            kwargs["context"] = context
+        (offset, after_id) = (0, 0)
+        while True:
+            if order:
+                records = client.execute_kw(cls._odoo_model, 'search_read', [domain],
+                                            dict(kwargs, offset=offset))
+                offset += len(records)
+            else:
+                records = client.execute_kw(cls._odoo_model, 'search_read',
+                                            [domain + [('id', '>', after_id)]], kwargs)
+            for rec in records:
+                yield (rec["id"],) + tuple(convert(rec[name]) for (name, convert) in zip(fieldnames, converters))
+            if len(records) < chunk_size:
+                return
+            after_id = records[-1]["id"]
+
+    @classmethod
+    def odoo_rows(cls, domain=None, fieldnames=None, **kwargs):
+        """Same as `odoo_values`, but yields named tuples, with the attributes *odoo_id* and *fieldnames*
+
+            A field whose name is not a valid attribute name (e.g. `__last_update`) is named after
+            its position in the tuple instead (e.g. `_3`).
+        """
+        fieldnames = tuple(fieldnames or cls._get_odoo_read_fields())
+        row_type = _row_types.get((cls, fieldnames))
+        if row_type is None:
+            row_type = _row_types[(cls, fieldnames)] = namedtuple("%sRow" % cls.__name__, ("odoo_id",) + fieldnames,
+                                                                  rename=True)
+        for values in cls.odoo_values(domain, fieldnames=fieldnames, **kwargs):
+            yield row_type._make(values)
+
+    @classmethod
+    def odoo_sync_changes(cls, domain=None, chunk_size=None, detect_deletions=False, client=None):
+        """Loads the records modified in Odoo since the last sync
+
+            The high-water mark of the sync (the `write_date` and identifier of the last record
+            loaded) is stored in an `OdooSyncState`. The records matching *domain* that were written
+            after it are searched by increasing `write_date` and identifier, and loaded in bulk with
+            `odoo_search`, *chunk_size* at a time (setting ODOO_BATCH_SIZE by default); the mark is
+            saved after each chunk.
+
+            If *detect_deletions* is True, the local instances whose record was deleted in Odoo are
+            deleted; their identifiers are checked *chunk_size* at a time, including the archived
+            records.
+
+            :return (int, int): the numbers of records loaded and deleted
         """
         client = client or settings.odoo
-        odoo_ids = client.search(cls._odoo_model, domain, offset=offset, limit=limit, order=order, context=context)
-        return cls.odoo_load(odoo_ids, client=client) if odoo_ids else []
+        chunk_size = chunk_size or getattr(settings, "ODOO_BATCH_SIZE", 500)
+        state, _created = OdooSyncState.objects.get_or_create(
+            model="%s.%s" % (cls._meta.app_label, cls._meta.model_name))
+        loaded = 0
+        while True:
+            watermark = []
+            if state.write_date:
+                watermark = ['|', ('write_date', '>', state.write_date),
+                             '&', ('write_date', '=', state.write_date), ('id', '>', state.odoo_id)]
+            objs = cls.odoo_search(list(domain or []) + watermark, limit=chunk_size, order='write_date, id',
+                                   client=client, bulk=True)
+            if not objs:
+                break
+            dates = client.model(cls._odoo_model).read([obj.odoo_id for obj in objs], fields=['write_date'])
+            state.write_date, state.odoo_id = max((rec['write_date'] or '', rec['id']) for rec in dates)
+            state.save()
+            loaded += len(objs)
+            if len(objs) < chunk_size:
+                break
+        deleted = 0
+        if detect_deletions:
+            # the records archived or no longer matching *domain* still exist: they are kept
+            local_ids = sorted(odoo_id for odoo_id in cls.objects.values_list('odoo_id', flat=True) if odoo_id)
+            for start in range(0, len(local_ids), chunk_size):
+                chunk = local_ids[start:start + chunk_size]
+                existing = set(client.search(cls._odoo_model, [('id', 'in', chunk)],
+                                             context={'active_test': False}))
+                removed = [odoo_id for odoo_id in chunk if odoo_id not in existing]
+                if removed:
+                    cls.objects.filter(odoo_id__in=removed).delete()
+                    deleted += len(removed)
+        return loaded, deleted
+
+    @classmethod
+    def aodoo_load(cls, odoo_ids, **kwargs):
+        """Asynchronous version of `odoo_load` (see `djangodoo.aio`)"""
+        from . import aio
+        return aio.run(cls.odoo_load, odoo_ids, **kwargs)
+
+    @classmethod
+    def aodoo_search(cls, domain, **kwargs):
+        """Asynchronous version of `odoo_search` (see `djangodoo.aio`)"""
+        from . import aio
+        return aio.run(cls.odoo_search, domain, **kwargs)
+
+    @classmethod
+    def aodoo_write(cls, objs, args, client=None):
+        """Asynchronous version of `odoo_write` (see `djangodoo.aio`)"""
+        from . import aio
+        return aio.run(cls.odoo_write, objs, args, client=client)
 
     @classmethod
     def odoo_write(cls, objs, args, client=None):
@@ -96,56 +611,192 @@ class OdooModel(models.Model):
             Writes the values provided in *args* into the Odoo records originating
             the Django instances provided in *objs*
         """
-        def convert(args):
-            res = {}
-            for field in cls._meta.fields:
-                if field.name in args and hasattr(field, "odoo_field"):
-                    res[field.name] = field.odoo_field.convert_back(args[field.name])
-            return res
-
         client = client or settings.odoo
         odoo_model = cls._odoo_model
         odoo_ids = [o.odoo_id for o in objs if o.odoo_id]
-        return client.model(odoo_model).write(odoo_ids, convert(args))
+        return client.model(odoo_model).write(odoo_ids, cls._odoo_convert_back(args))
 
     @classmethod
     def cache_translation(cls, lang):
         """
             Récupère les traductions dans la langue `lang` des détails de tous les champs de l'objet
             Ces détails traduits sont stockés en cache dans chaque objet OdooField
+
+            Les détails traduits sont aussi partagés entre les processus grâce au cache Django indiqué
+            par le paramètre ODOO_TRANSLATION_CACHE ("default" par défaut), pendant
+            ODOO_TRANSLATION_CACHE_TTL secondes (un jour par défaut)
         """
         def convert_lang(lang):
             res = lang.replace("-", "_")
             if "_" in res:
                 res = res[:3] + res[3:].upper()
             return res
-        trans_fields = settings.odoo.execute(cls._odoo_model, 'fields_get', [], context={"lang": convert_lang(lang)})
-        for field in cls._meta.fields:
+        cache = caches[getattr(settings, "ODOO_TRANSLATION_CACHE", "default")]
+        key = "djangodoo:translation:%s:%s" % (cls._odoo_model, lang)
+        trans_fields = cache.get(key)
+        if trans_fields is None:
+            trans_fields = settings.odoo.execute(cls._odoo_model, 'fields_get', [], context={"lang": convert_lang(lang)})
+            trans_fields = dict((name, dict((k, v) for (k, v) in details.items() if k in TRANSLATED_DETAILS))
+                                for (name, details) in trans_fields.items())
+            cache.set(key, trans_fields, getattr(settings, "ODOO_TRANSLATION_CACHE_TTL", 24 * 3600))
+        for field in list(cls._meta.fields) + list(cls._meta.many_to_many):
             if hasattr(field, "odoo_field") and trans_fields.get(field.name):
                 field.odoo_field.translation_cache[lang] = trans_fields[field.name]
+                field.odoo_field.selection_index.pop(lang, None)
+
+    def _odoo_snapshot(self, fieldnames=None):
+        """Returns the current state of the Odoo fields *fieldnames* (all of them if None), see `_odoo_mark_clean`"""
+        plan = type(self)._get_odoo_plan()
+        values = dict((attname, self.__dict__.get(attname)) for (name, attname, _d, _b, _r) in plan
+                      if fieldnames is None or name in fieldnames)
+        # the commands of a many2many field recorded so far, i.e. the first ones of its list
+        m2m = dict((name, (commands, len(commands))) for (name, commands) in self._odoo_m2m_changes.items()
+                   if fieldnames is None or name in fieldnames)
+        return values, m2m
+
+    def _odoo_mark_clean(self, fieldnames=None, snapshot=None):
+        """Remembers the values of the Odoo fields *fieldnames* (all of them if None) as those of Odoo
+
+            The values are the current ones, or those of *snapshot* (see `_odoo_snapshot`) if the
+            values were pushed before (e.g. by `djangodoo.batch.odoo_batch`).
+        """
+        (values, m2m) = snapshot or self._odoo_snapshot(fieldnames)
+        for (name, (commands, count)) in m2m.items():
+            # the commands recorded since the snapshot are still to be pushed
+            if self._odoo_m2m_changes.get(name) is commands:
+                del commands[:count]
+                if not commands:
+                    del self._odoo_m2m_changes[name]
+        if fieldnames is None:
+            self._odoo_loaded = dict(values)
+        elif self._odoo_loaded is not None:
+            self._odoo_loaded.update(values)
+
+    def odoo_dirty_fields(self):
+        """Returns the names of the Odoo fields modified since the instance was loaded from Odoo or pushed
+
+            The many2many fields are modified if targets were added or removed with their manager.
+
+            :return list: the names of the modified fields, or None if the instance was not loaded
+                with `odoo_load`
+        """
+        if self._odoo_loaded is None:
+            return None
+        return [name for (name, attname, _d, _b, _r) in type(self)._get_odoo_plan()
+                if attname in self._odoo_loaded and self.__dict__.get(attname) != self._odoo_loaded[attname]] + \
+            [name for name in self._odoo_m2m_changes]
+
+    def odoo_fetch_deferred(self, fieldnames=None, client=None):
+        """Reads from Odoo the values of deferred fields of the instance
+
+            The values of the fields *fieldnames* (by default, the deferred fields that were not
+            fetched yet) are read, converted and set on the instance, but not saved.
+        """
+        cls = type(self)
+        fieldnames = list(self._odoo_pending if fieldnames is None else fieldnames)
+        if not fieldnames:
+            return
+        client = client or settings.odoo
+        rec = client.model(cls._odoo_model).read([self.odoo_id], fields=fieldnames, context=None)[0]
+        for (name, attname, convert_data, _convert_back, _relation) in cls._get_odoo_plan():
+            if name in fieldnames and name in rec:
+                setattr(self, name, convert_data(rec[name]) if convert_data else rec[name] or None)
+                if self._odoo_loaded is not None:
+                    self._odoo_loaded[attname] = self.__dict__.get(attname)
+        self._odoo_pending.difference_update(fieldnames)
+
+    def odoo_stream_binary(self, fieldname, fileobj, chunk_size=64 * 1024, client=None):
+        """Reads the value of a binary field from Odoo and writes it decoded into *fileobj*
+
+            The value is decoded by chunks of about *chunk_size* bytes, so the whole base64 string
+            and the whole decoded value are never held in memory at the same time.
+
+            :return int: the number of bytes written
+        """
+        client = client or settings.odoo
+        data = client.model(type(self)._odoo_model).read([self.odoo_id], fields=[fieldname],
+                                                         context=None)[0][fieldname] or ""
+        step = chunk_size // 3 * 4
+        written = 0
+        rest = data[:0]
+        for start in range(0, len(data), step):
+            # the values encoded with `base64.encodestring` contain line breaks: the characters
+            # are decoded by groups of 4, and the incomplete group is kept for the next chunk
+            chunk = rest + data[start:start + step]
+            chunk = chunk[:0].join(chunk.split())
+            end = len(chunk) - len(chunk) % 4
+            (chunk, rest) = (base64.b64decode(chunk[:end]), chunk[end:])
+            fileobj.write(chunk)
+            written += len(chunk)
+        if rest:
+            # not a valid base64 value: raises the error of `BinaryField.convert_data`
+            base64.b64decode(rest)
+        return written
 
     def _convert_to_push(self, fieldnames=None):
-        res = {}
-        fieldnames = fieldnames or type(self)._get_odoo_fields()
-        for field in type(self)._meta.fields:
-            if hasattr(field, "odoo_field") and field.name in fieldnames:
-                res[field.name] = field.odoo_field.convert_back(getattr(self, field.name))
+        cls = type(self)
+        if not fieldnames:
+            # the deferred fields are pushed unless they were not fetched (nor set) yet
+            fieldnames = cls._get_odoo_read_fields() + [
+                name for (name, attname, _d, _b, _r) in cls._get_odoo_plan()
+                if name in (cls._odoo_deferred_fields or []) and name not in self._odoo_pending
+                and attname in self.__dict__]
+        fieldnames = set(fieldnames)
+        # the lazy many2one fields are pushed from their Odoo identifier, without loading the target
+        res = cls._odoo_convert_back(dict((name, self.__dict__.get(attname) if relation and cls._odoo_lazy_m2o
+                                           else getattr(self, name))
+                                          for (name, attname, _d, _b, relation) in cls._get_odoo_plan()
+                                          if name in fieldnames))
+        # the many2many fields are pushed with the changes made with their manager if any,
+        # or with all their targets otherwise
+        for field in cls._get_odoo_m2m():
+            if field.name not in fieldnames:
+                continue
+            if self._odoo_m2m_changes.get(field.name):
+                res[field.name] = list(self._odoo_m2m_changes[field.name])
+            elif self.pk is not None:
+                res[field.name] = field.odoo_field.convert_back(
+                    getattr(self, field.name).values_list("odoo_id", flat=True))
         return res
 
+    def aodoo_push(self, fieldnames=None, client=None):
+        """Asynchronous version of `odoo_push` (see `djangodoo.aio`)"""
+        from . import aio
+        return aio.run(self.odoo_push, fieldnames=fieldnames, client=client)
+
     def odoo_push(self, fieldnames=None, client=None):
         """Saves a Django instance into Odoo
 
             If the instance has an *odoo_id* then we call `write`, otherwise we call `create`;
             we only save the values of the fields indicated in `fieldnames`, or all
-            of them if it is None.
+            of them if it is None (except the deferred fields not fetched yet). However, if `fieldnames` is None and the instance was loaded
+            with `odoo_load`, we only save the fields modified since then (see `odoo_dirty_fields`),
+            and do not call Odoo at all if none was modified.
+
+            Inside a `djangodoo.batch.odoo_batch` block, the push is only collected, and sent with
+            the other ones at the end of the block.
 
-            :todo: deal with one2many and many2many fields?
+            The many2many fields are pushed as Odoo commands: the targets added or removed with
+            their manager since the instance was loaded or pushed, or all of them (see
+            `_convert_to_push`).
+
+            :todo: deal with one2many fields?
         """
         odoo_model = type(self)._odoo_model
-        client = client or settings.odoo
+        if fieldnames is None and self.odoo_id:
+            fieldnames = self.odoo_dirty_fields()
+            if fieldnames == []:
+                return self.odoo_id
         args = self._convert_to_push(fieldnames)
+        batch = current_batch()
+        if batch is not None:
+            # the instance is marked clean once the values are sent
+            batch.add(self, args, client=client, fieldnames=fieldnames)
+            return self.odoo_id or None
+        client = client or settings.odoo
         if self.odoo_id:
             client.model(odoo_model).write([self.odoo_id], args)
+            self._odoo_mark_clean(fieldnames)
             return self.odoo_id
         else:
             return client.model(odoo_model).create(args)
@@ -163,12 +814,218 @@ class OdooModel(models.Model):
 #         return super(OdooModel, self).__getitem__()
 
 
+def prewarm_translations(languages=None):
+    """Caches the translations of the details of the fields of all the OdooModels
+
+        The translations are fetched in the *languages* given as a list of codes (by default,
+        those of the LANGUAGES setting), and stored in the shared cache (see `cache_translation`).
+    """
+    languages = languages or [code for (code, _name) in settings.LANGUAGES]
+    for model in set(settings.odoo_models.values()):
+        for lang in languages:
+            model.cache_translation(lang)
+
+
+def prefetch_odoo_related(objs, fieldnames=None, client=None):
+    """Resolves at once the lazy many2one fields of a list of instances of an OdooModel
+
+        For each many2one field (among *fieldnames* if given) of the model of *objs*, which must have
+        `_odoo_lazy_m2o`, the targets are fetched with one query, and the missing ones are loaded
+        from Odoo with one `read` (see `OdooModel.odoo_resolve`), then set on the instances.
+
+        :return list: the instances
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    cls = type(objs[0])
+    for (name, attname, _convert_data, _convert_back, relation) in cls._get_odoo_plan():
+        if relation and (fieldnames is None or name in fieldnames):
+            odoo_ids = set(obj.__dict__.get(attname) for obj in objs) - set([None])
+            targets = cls._meta.get_field(name).related_model.odoo_resolve(odoo_ids, client=client)
+            for obj in objs:
+                if obj.__dict__.get(attname) in targets:
+                    setattr(obj, name, targets[obj.__dict__[attname]])
+    return objs
+
+
+def _odoo_m2m_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Records the changes of the many2many fields of an OdooModel as Odoo commands, to be pushed"""
+    if reverse or not isinstance(instance, OdooModel) or action not in ("post_add", "post_remove", "post_clear"):
+        return
+    for field in type(instance)._get_odoo_m2m():
+        if field.remote_field.through is sender:
+            if action == "post_clear":
+                instance._odoo_m2m_changes[field.name] = [(5, 0, 0)]
+            else:
+                command = 4 if action == "post_add" else 3
+                commands = [(command, odoo_id, 0) for odoo_id in
+                            model.objects.filter(pk__in=pk_set or ()).values_list("odoo_id", flat=True)]
+                if not commands:
+                    # e.g. the targets added were already linked
+                    continue
+                instance._odoo_m2m_changes.setdefault(field.name, []).extend(commands)
+            if instance._odoo_write_behind and not is_suppressed():
+                # the worker pushes all the targets
+                enqueue(instance, [field.name])
+                del instance._odoo_m2m_changes[field.name]
+
+
+def _odoo_write_behind_saved(sender, instance, raw, **kwargs):
+    """Queues the push of the fields modified by the save of an instance of an OdooModel having `_odoo_write_behind`"""
+    if raw or not isinstance(instance, OdooModel) or not instance._odoo_write_behind or is_suppressed():
+        return
+    fieldnames = instance.odoo_dirty_fields()
+    if fieldnames == []:
+        return
+    enqueue(instance, fieldnames)
+    instance._odoo_mark_clean(fieldnames)
+
+
+m2m_changed.connect(_odoo_m2m_changed, dispatch_uid="djangodoo_m2m_changed")
+post_save.connect(_odoo_write_behind_saved, dispatch_uid="djangodoo_write_behind_saved")
+
+
+class OdooSearchResult(object):
+
+    """Lazy result of a search in Odoo
+
+        Like a Django queryset, the result can be sliced, indexed, iterated and counted (with
+        `search_count`), so it can be given to a `django.core.paginator.Paginator`. The records
+        are loaded with `OdooModel.odoo_search` by pages of *page_size* records (setting
+        ODOO_PAGE_SIZE, 80 by default), only when they are accessed; the pages are then cached.
+    """
+
+    def __init__(self, model, domain, order=None, page_size=None, context=None, client=None):
+        self.model = model
+        self.domain = search_domain(domain)
+        self.order = order
+        self.page_size = page_size or getattr(settings, "ODOO_PAGE_SIZE", 80)
+        self.context = context
+        self.client = client
+        self._count = None
+        self._pages = {}
+
+    def count(self):
+        if self._count is None:
+            client = self.client or settings.odoo
+            kwargs = {"context": self.context} if self.context else {}
+            self._count = client.execute_kw(self.model._odoo_model, 'search_count', [self.domain], kwargs)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def _page(self, number):
+        if number not in self._pages:
+            self._pages[number] = self.model.odoo_search(self.domain, offset=number * self.page_size,
+                                                         limit=self.page_size, order=self.order,
+                                                         context=self.context, client=self.client)
+        return self._pages[number]
+
+    def _range(self, start, stop):
+        res = []
+        for number in range(start // self.page_size, -(-stop // self.page_size)):
+            page = self._page(number)
+            res.extend(page[max(start - number * self.page_size, 0):stop - number * self.page_size])
+            if len(page) < self.page_size:
+                break
+        return res
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.count())
+            res = self._range(start, stop) if start < stop else []
+            return res[::step] if step != 1 else res
+        index = key + self.count() if key < 0 else key
+        res = self._range(index, index + 1) if index >= 0 else []
+        if not res:
+            raise IndexError("OdooSearchResult index out of range")
+        return res[0]
+
+    def __iter__(self):
+        number = 0
+        while True:
+            page = self._page(number)
+            for obj in page:
+                yield obj
+            if len(page) < self.page_size:
+                return
+            number += 1
+
+
+class OdooSyncState(models.Model):
+
+    """High-water mark of the incremental sync of an OdooModel (see `OdooModel.odoo_sync_changes`)
+
+        Attributes:
+            model: label of the Django model, as "app_label.model_name"
+            write_date: `write_date` of the last record loaded, in the Odoo format
+            odoo_id: identifier of the last record loaded, among those having this `write_date`
+    """
+
+    model = models.CharField(max_length=255, unique=True)
+    write_date = models.CharField(max_length=32, blank=True, default="")
+    odoo_id = models.IntegerField(default=0)
+
+
+class OdooSyncCheckpoint(models.Model):
+
+    """Progress of the sync of an OdooModel by the `odoo_sync` command (see `djangodoo.sync`)
+
+        Attributes:
+            model: label of the Django model, as "app_label.model_name"
+            last_id: identifier of the last record loaded
+            loaded: number of records loaded
+            done: whether all the records were loaded
+    """
+
+    model = models.CharField(max_length=255, unique=True)
+    last_id = models.IntegerField(default=0)
+    loaded = models.IntegerField(default=0)
+    done = models.BooleanField(default=False)
+
+
+class OdooPushQueue(models.Model):
+
+    """Push of an instance of an OdooModel waiting to be sent to Odoo (see `djangodoo.writebehind`)
+
+        Attributes:
+            model: label of the Django model, as "app_label.model_name"
+            object_id: primary key of the instance
+            fieldnames: comma-separated names of the fields to push, or None for all of them
+            created: time of the save
+            attempts: number of failed pushes
+            next_attempt: time before which the push is not retried
+            last_error: error of the last failed push
+    """
+
+    model = models.CharField(max_length=255)
+    object_id = models.IntegerField()
+    fieldnames = models.TextField(null=True)
+    created = models.FloatField()
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.FloatField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+
 class OdooUser(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, blank=False, related_name='odoo_user')
 
+    _odoo_client = None
+
     def __init__(self, *args, **kwargs):
-        config = getattr(settings, "ODOO_HOST", False)
+        self._odoo_password = kwargs.pop('password', None)
         super(OdooUser, self).__init__(*args, **kwargs)
-        passwd = kwargs.get('password') or caches["odoo_auth"].get('%s_credentials' % self.user.username)
-        self.odoo_client = erppeek.Client("%s:%d" % (config['HOST'], config['PORT']), db=config['DB'],
-                                          user=self.user.username, password=passwd, verbose=False)
+
+    @property
+    def odoo_client(self):
+        """Client logged in Odoo as this user, taken from the cache of the clients of the users on first use"""
+        if self._odoo_client is None:
+            passwd = self._odoo_password or caches["odoo_auth"].get('%s_credentials' % self.user.username)
+            self._odoo_client = get_user_clients().get(self.user.username, passwd)
+        return self._odoo_client
+
+    @odoo_client.setter
+    def odoo_client(self, client):
+        self._odoo_client = client
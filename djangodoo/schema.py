@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from threading import RLock
+from time import time
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+"""
+    Snapshot of the Odoo fields definitions
+
+    The output of `fields_get` is stored per model in the JSON file given by the ODOO_SCHEMA_CACHE
+    setting, so that the models can be prepared without calling Odoo. An entry older than
+    ODOO_SCHEMA_CACHE_TTL seconds (if set) is fetched again, unless Odoo cannot be reached; the
+    whole snapshot can be refreshed with the `odoo_refresh_schema` management command.
+"""
+
+SCHEMA_VERSION = 1
+
+_lock = RLock()
+_snapshot = None
+
+
+def _server_key():
+    config = getattr(settings, "ODOO_HOST", False) or {}
+    return "%s:%s/%s" % (config.get('HOST'), config.get('PORT'), config.get('DB'))
+
+
+def _load_snapshot(path):
+    try:
+        with open(path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (IOError, OSError, ValueError):
+        return {}
+    if snapshot.get("version") != SCHEMA_VERSION or snapshot.get("server") != _server_key():
+        logger.info("Ignoring the outdated Odoo schema snapshot %s", path)
+        return {}
+    return snapshot.get("models", {})
+
+
+def _save_snapshot(path, models):
+    tmp_path = "%s.tmp" % path
+    with open(tmp_path, "w") as snapshot_file:
+        json.dump({"version": SCHEMA_VERSION, "server": _server_key(), "models": models},
+                  snapshot_file, sort_keys=True)
+    getattr(os, "replace", os.rename)(tmp_path, path)
+
+
+def _get_snapshot(path):
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = _load_snapshot(path)
+    return _snapshot
+
+
+def _fetch_fields(odoo_model, client=None):
+    client = client or settings.odoo
+    return client.model(odoo_model).fields()
+
+
+def get_fields(odoo_model, names=None, client=None):
+    """Returns the details of the fields of *odoo_model*, as returned by `fields_get`
+
+        If *names* is given, only the details of these fields are returned. The details are
+        read from the snapshot when it is enabled and up to date, and stored in it otherwise. An
+        outdated entry is still used if the fields cannot be fetched from Odoo.
+    """
+    path = getattr(settings, "ODOO_SCHEMA_CACHE", None)
+    if not path:
+        return (client or settings.odoo).model(odoo_model).fields(names)
+    ttl = getattr(settings, "ODOO_SCHEMA_CACHE_TTL", None)
+    with _lock:
+        snapshot = _get_snapshot(path)
+        entry = snapshot.get(odoo_model)
+        if not entry:
+            entry = {"timestamp": time(), "fields": _fetch_fields(odoo_model, client)}
+            snapshot[odoo_model] = entry
+            _save_snapshot(path, snapshot)
+        elif ttl is not None and time() - entry["timestamp"] > ttl:
+            try:
+                fields = _fetch_fields(odoo_model, client)
+            except Exception:
+                # e.g. Odoo is unreachable: the outdated entry is better than no entry at all
+                logger.warning("Could not refresh the fields of %s: using the outdated snapshot", odoo_model,
+                               exc_info=True)
+            else:
+                entry = {"timestamp": time(), "fields": fields}
+                snapshot[odoo_model] = entry
+                _save_snapshot(path, snapshot)
+    fields = entry["fields"]
+    if names is None:
+        return fields
+    return dict((name, fields[name]) for name in names if name in fields)
+
+
+def refresh(odoo_models, client=None):
+    """Fetches the fields of *odoo_models* from Odoo and stores them in the snapshot"""
+    path = getattr(settings, "ODOO_SCHEMA_CACHE", None)
+    if not path:
+        return
+    with _lock:
+        snapshot = _get_snapshot(path)
+        for odoo_model in odoo_models:
+            snapshot[odoo_model] = {"timestamp": time(), "fields": _fetch_fields(odoo_model, client)}
+        _save_snapshot(path, snapshot)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from time import time
+import django
+import logging
+import os
+
+from .client import connect_default, LazyClient
+
+logger = logging.getLogger(__name__)
+
+"""
+    Sync of several OdooModels
+
+    The models are synced in the order of their many2one and many2many fields, so that the targets of the
+    records are already in the database when they are loaded. The models whose dependencies are
+    synced are synced in parallel, each one in a process. The progress of each model is saved in
+    an `OdooSyncCheckpoint` after each chunk, so that an interrupted sync resumes where it stopped.
+"""
+
+
+def model_label(model):
+    return "%s.%s" % (model._meta.app_label, model._meta.model_name)
+
+
+def dependencies(models):
+    """Returns the models among *models* that are targets of the many2one and many2many fields of each model"""
+    by_odoo_model = dict((model._odoo_model, model) for model in models)
+    res = {}
+    for model in models:
+        relations = [relation for (_name, _attname, _cd, _cb, relation) in model._get_odoo_plan()]
+        relations += [field.odoo_field.details['relation'] for field in model._get_odoo_m2m()]
+        res[model] = set(by_odoo_model[relation] for relation in relations
+                         if relation in by_odoo_model and by_odoo_model[relation] is not model)
+    return res
+
+
+def dependency_order(models):
+    """Returns *models* sorted so that each model comes after its dependencies
+
+        The models of a cycle of dependencies are sorted arbitrarily (their many2one targets are
+        then loaded with the records, see `OdooModel.odoo_resolve`).
+    """
+    deps = dependencies(models)
+    res = []
+    while deps:
+        ready = sorted((model for (model, model_deps) in deps.items() if not model_deps), key=model_label)
+        if not ready:
+            ready = [min(deps, key=lambda model: (len(deps[model]), model_label(model)))]
+            logger.warning("Cycle of dependencies between %s: syncing %s first",
+                           ", ".join(sorted(model_label(model) for model in deps)), model_label(ready[0]))
+        for model in ready:
+            del deps[model]
+        for model_deps in deps.values():
+            model_deps.difference_update(ready)
+        res.extend(ready)
+    return res
+
+
+_worker_pid = None
+
+
+def sync_model(label, chunk_size=None, workers=None):
+    """Loads all the records of the model *label*, resuming from its checkpoint
+
+        :return (str, int, float): the label, number of records loaded and duration
+    """
+    global _worker_pid
+    if _worker_pid != os.getpid():
+        # in a new process: do not share the connections of the parent process
+        if not apps.ready:
+            django.setup()
+        connections.close_all()
+        settings.odoo = LazyClient(connect_default)
+        _worker_pid = os.getpid()
+    from .models import OdooSyncCheckpoint
+    model = apps.get_model(label)
+    checkpoint, _created = OdooSyncCheckpoint.objects.get_or_create(model=label)
+    started = time()
+    if not checkpoint.done:
+        loaded = checkpoint.loaded
+        for (chunk_loaded, last_id) in model.odoo_iter_sync(chunk_size=chunk_size, after_id=checkpoint.last_id,
+                                                            workers=workers):
+            checkpoint.last_id, checkpoint.loaded = last_id, loaded + chunk_loaded
+            checkpoint.save()
+        checkpoint.done = True
+        checkpoint.save()
+    return label, checkpoint.loaded, time() - started
+
+
+def sync_models(models=None, processes=None, chunk_size=None, workers=None, restart=False, callback=None):
+    """Syncs *models* (all the OdooModels by default) in the order of their dependencies
+
+        Up to *processes* models (setting ODOO_SYNC_PROCESSES, 4 by default) are synced at the
+        same time, each one in its own process. If *restart* is True, the checkpoints of an
+        interrupted sync are discarded; otherwise, the models already synced are skipped and the
+        others resume after their last chunk. The checkpoints are deleted when all the models
+        are synced. *callback* is called with the label, number of records and duration of each
+        model synced.
+    """
+    global _worker_pid
+    from .models import OdooSyncCheckpoint
+    _worker_pid = os.getpid()
+    models = list(models or set(settings.odoo_models.values()))
+    processes = processes or getattr(settings, "ODOO_SYNC_PROCESSES", 4)
+    labels = [model_label(model) for model in models]
+    if restart:
+        OdooSyncCheckpoint.objects.filter(model__in=labels).delete()
+    order = [model_label(model) for model in dependency_order(models)]
+    # the dependencies of a model on the models synced after it (in a cycle) are ignored
+    deps = dict((model_label(model), set(model_label(dep) for dep in model_deps
+                                         if order.index(model_label(dep)) < order.index(model_label(model))))
+                for (model, model_deps) in dependencies(models).items())
+    callback = callback or (lambda label, loaded, duration: None)
+
+    if processes <= 1:
+        for label in order:
+            callback(*sync_model(label, chunk_size, workers))
+    else:
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        connections.close_all()
+        done, running = set(), {}
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            while len(done) < len(order):
+                for label in order:
+                    if label not in done and label not in running.values() and deps[label] <= done:
+                        running[executor.submit(sync_model, label, chunk_size, workers)] = label
+                finished, _pending = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    del running[future]
+                    result = future.result()
+                    callback(*result)
+                    done.add(result[0])
+    OdooSyncCheckpoint.objects.filter(model__in=labels).delete()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from contextlib import contextmanager
+from time import time
+import logging
+import threading
+
+from .breaker import UNAVAILABLE_ERRORS, OdooUnavailable
+
+logger = logging.getLogger(__name__)
+
+"""
+    Write-behind replication of the saves of OdooModels into Odoo
+
+    When an OdooModel has `_odoo_write_behind`, saving an instance (or changing its many2many
+    fields) does not call Odoo: the names of the modified fields are stored in an `OdooPushQueue`
+    entry, in the same transaction as the save. The entries are then processed by `process_queue`
+    (see the `odoo_write_behind` command): the entries of the same instance are merged into a
+    single `odoo_push` of the current values of all the fields they name. A failed push is retried
+    after ODOO_WRITE_BEHIND_BACKOFF (5) seconds, doubled after each attempt up to
+    ODOO_WRITE_BEHIND_MAX_BACKOFF (600); after ODOO_WRITE_BEHIND_MAX_ATTEMPTS (10) attempts, the
+    entries are kept but not retried anymore. They are not retried either if the instance was
+    created in Odoo but its new identifier could not be saved: the identifier is kept in their
+    *last_error*. The saves made while loading records from Odoo are not queued.
+"""
+
+_local = threading.local()
+
+
+@contextmanager
+def suppress_write_behind():
+    """Does not queue the saves made in the block (e.g. while loading records from Odoo)"""
+    depth = getattr(_local, "suppressed", 0)
+    _local.suppressed = depth + 1
+    try:
+        yield
+    finally:
+        _local.suppressed = depth
+
+
+def is_suppressed():
+    return getattr(_local, "suppressed", 0) > 0
+
+
+def enqueue(obj, fieldnames=None):
+    """Queues the push of the fields *fieldnames* (all of them if None) of the instance *obj*"""
+    from .models import OdooPushQueue
+    OdooPushQueue.objects.create(
+        model="%s.%s" % (obj._meta.app_label, obj._meta.model_name), object_id=obj.pk,
+        fieldnames=None if fieldnames is None else ",".join(sorted(fieldnames)), created=time())
+
+
+def _backoff(attempts):
+    delay = getattr(settings, "ODOO_WRITE_BEHIND_BACKOFF", 5) * 2 ** (attempts - 1)
+    return min(delay, getattr(settings, "ODOO_WRITE_BEHIND_MAX_BACKOFF", 600))
+
+
+class _LinkError(Exception):
+    """Raised when a record was created in Odoo, but its identifier could not be saved"""
+
+    def __init__(self, odoo_id, error):
+        self.odoo_id = odoo_id
+        super(_LinkError, self).__init__("created in Odoo with the identifier %d, which could not be saved: %s"
+                                         % (odoo_id, error))
+
+
+def _push(model, object_id, fieldnames, client=None):
+    obj = model.objects.filter(pk=object_id).first()
+    if obj is None:
+        # deleted since it was saved
+        return
+    odoo_id = obj.odoo_push(fieldnames=fieldnames, client=client)
+    if not obj.odoo_id and odoo_id:
+        # erppeek returns the record created
+        odoo_id = int(getattr(odoo_id, "id", odoo_id))
+        try:
+            with transaction.atomic():
+                model.objects.filter(pk=object_id).update(odoo_id=odoo_id)
+        except Exception as e:
+            raise _LinkError(odoo_id, e)
+
+
+def process_queue(limit=None, client=None):
+    """Pushes the instances of the entries of the queue that are due
+
+        At most *limit* entries (setting ODOO_BATCH_SIZE, 500 by default) are processed, by order
+        of creation. The processing stops at the first push failing because Odoo is unavailable,
+        since the next ones would fail too. A single process should process the queue at a time.
+
+        :return (int, int): the numbers of instances pushed and failed
+    """
+    from .models import OdooPushQueue
+    limit = limit or getattr(settings, "ODOO_BATCH_SIZE", 500)
+    max_attempts = getattr(settings, "ODOO_WRITE_BEHIND_MAX_ATTEMPTS", 10)
+    now = time()
+    entries = OdooPushQueue.objects.filter(next_attempt__lte=now, attempts__lt=max_attempts).order_by("id")[:limit]
+    groups = {}  # (model, object id): entries
+    for entry in entries:
+        groups.setdefault((entry.model, entry.object_id), []).append(entry)
+    pushed = failed = 0
+    for ((label, object_id), group) in sorted(groups.items(), key=lambda item: item[1][0].id):
+        if any(entry.fieldnames is None for entry in group):
+            fieldnames = None
+        else:
+            fieldnames = sorted(set(name for entry in group for name in entry.fieldnames.split(",") if name))
+        ids = [entry.id for entry in group]
+        try:
+            _push(apps.get_model(label), object_id, fieldnames, client=client)
+        except _LinkError as e:
+            # pushing again would create another record: the entries are given up, with the identifier
+            failed += 1
+            OdooPushQueue.objects.filter(id__in=ids).update(attempts=max_attempts, last_error=str(e)[:1000])
+            logger.error("Giving up pushing %s %s: %s", label, object_id, e)
+        except Exception as e:
+            failed += 1
+            attempts = max(entry.attempts for entry in group) + 1
+            OdooPushQueue.objects.filter(id__in=ids).update(attempts=attempts, next_attempt=now + _backoff(attempts),
+                                                            last_error=str(e)[:1000])
+            if attempts >= max_attempts:
+                logger.error("Giving up pushing %s %s after %d attempts: %s", label, object_id, attempts, e)
+            else:
+                logger.warning("Failed to push %s %s (attempt %d): %s", label, object_id, attempts, e)
+            if isinstance(e, UNAVAILABLE_ERRORS + (OdooUnavailable,)):
+                break
+        else:
+            pushed += 1
+            OdooPushQueue.objects.filter(id__in=ids).delete()
+    return pushed, failed
+
+
+def queue_stats():
+    """Returns the metrics of the queue
+
+        :return dict: the number of entries (*depth*), of distinct instances (*records*), of entries
+            given up (*failed*), and the age in seconds of the oldest entry (*lag*, 0 if empty)
+    """
+    from .models import OdooPushQueue
+    max_attempts = getattr(settings, "ODOO_WRITE_BEHIND_MAX_ATTEMPTS", 10)
+    stats = OdooPushQueue.objects.aggregate(depth=Count("id"), oldest=Min("created"))
+    return {
+        "depth": stats["depth"],
+        "records": OdooPushQueue.objects.values("model", "object_id").distinct().count(),
+        "failed": OdooPushQueue.objects.filter(attempts__gte=max_attempts).count(),
+        "lag": time() - stats["oldest"] if stats["oldest"] is not None else 0,
+    }
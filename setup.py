@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import os
-from setuptools import setup
+from setuptools import find_packages, setup
 
 with open(os.path.join(os.path.dirname(__file__), 'README.rst')) as readme:
     README = readme.read()
@@ -11,7 +11,7 @@ os.chdir(os.path.normpath(os.path.join(os.path.abspath(__file__), os.pardir)))
 setup(
     name='djangodoo',
     version='0.2.5',
-    packages=['djangodoo'],
+    packages=find_packages(exclude=['benchmarks*']),
     include_package_data=True,
     license='MIT License',
     description='A Django app to copy models, load and save records from a running Odoo instance',